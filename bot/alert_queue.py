@@ -0,0 +1,133 @@
+"""
+Bounded alert queue
+Holds rendered alerts between the producers (poller, API) and the sender.
+When it is full the configured policy decides what happens: reject the new
+alert, drop the oldest one, or coalesce it into a queued alert for the same
+domain and event type.
+"""
+
+import os
+import time
+import asyncio
+from collections import OrderedDict
+
+from bot_logging import get_logger
+
+logger = get_logger(__name__)
+
+ALERT_QUEUE_SIZE = int(os.getenv('ALERT_QUEUE_SIZE', '1000'))
+ALERT_QUEUE_POLICY = os.getenv('ALERT_QUEUE_POLICY', 'reject').lower()
+
+REJECT = 'reject'
+DROP_OLDEST = 'drop_oldest'
+COALESCE = 'coalesce'
+POLICIES = (REJECT, DROP_OLDEST, COALESCE)
+
+class AlertQueue:
+    """FIFO of (message, recipients, record) with a size bound and an overflow policy."""
+
+    def __init__(self, maxsize=ALERT_QUEUE_SIZE, policy=ALERT_QUEUE_POLICY):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown alert queue policy {policy!r}, expected one of {', '.join(POLICIES)}")
+
+        self.maxsize = maxsize
+        self.policy = policy
+        # seq -> [message, recipients, record, enqueued_at]
+        self._items = OrderedDict()
+        # (domain, event type) -> seq of its newest queued alert, only used when coalescing
+        self._by_key = {}
+        self._seq = 0
+        self._not_empty = asyncio.Event()
+        self._not_full = asyncio.Event()
+        self._not_full.set()
+        self.rejected = 0
+        self.dropped = 0
+        self.coalesced = 0
+
+    def __len__(self):
+        return len(self._items)
+
+    def free(self):
+        return self.maxsize - len(self._items)
+
+    def full(self):
+        return len(self._items) >= self.maxsize
+
+    def offer(self, message, recipients=None, record=None):
+        """Queue an alert without waiting; returns False if the reject policy turned it away."""
+        key = self._key(record)
+
+        if self.full():
+            if self.policy == REJECT:
+                self.rejected += 1
+                return False
+            if key in self._by_key:
+                self._merge(self._items[self._by_key[key]], message, recipients, record)
+                self.coalesced += 1
+                return True
+            self._drop_oldest()
+
+        self._seq += 1
+        self._items[self._seq] = [message, recipients, record, time.monotonic()]
+        if key is not None:
+            self._by_key[key] = self._seq
+
+        self._not_empty.set()
+        if self.full():
+            self._not_full.clear()
+        return True
+
+    async def put(self, message, recipients=None, record=None):
+        """Queue an alert, waiting for room when the policy is reject so the producer slows down."""
+        if self.policy == REJECT:
+            while self.full():
+                await self._not_full.wait()
+        self.offer(message, recipients, record)
+
+    def _key(self, record):
+        if self.policy != COALESCE or record is None or not record.domain_name:
+            return None
+        return record.domain_name, record.event_type
+
+    def _merge(self, item, message, recipients, record):
+        # The newer event takes the queued one's place, sent only to the subscribers it matched
+        item[0], item[1], item[2] = message, recipients, record
+
+    def _drop_oldest(self):
+        seq, (message, recipients, record, enqueued_at) = self._items.popitem(last=False)
+        self._forget(seq, record)
+        self.dropped += 1
+        logger.warning("🗑️ Alert queue full, dropped an alert queued %.1fs ago", time.monotonic() - enqueued_at)
+
+    def _forget(self, seq, record):
+        key = self._key(record)
+        if key is not None and self._by_key.get(key) == seq:
+            del self._by_key[key]
+
+    async def get(self):
+        """Wait for the oldest alert and return (message, recipients, record)."""
+        while not self._items:
+            self._not_empty.clear()
+            await self._not_empty.wait()
+
+        seq, (message, recipients, record, _) = self._items.popitem(last=False)
+        self._forget(seq, record)
+        self._not_full.set()
+        return message, recipients, record
+
+    def oldest_age(self):
+        """Seconds the oldest queued alert has been waiting, 0 when empty."""
+        if not self._items:
+            return 0.0
+        return time.monotonic() - next(iter(self._items.values()))[3]
+
+    def stats(self):
+        return {
+            'depth': len(self._items),
+            'max_size': self.maxsize,
+            'policy': self.policy,
+            'oldest_age_seconds': round(self.oldest_age(), 3),
+            'rejected': self.rejected,
+            'dropped': self.dropped,
+            'coalesced': self.coalesced
+        }
@@ -0,0 +1,71 @@
+"""
+Synthetic Doma poll payloads
+Deterministic poll pages shaped like /v1/poll responses, with a configurable
+number of events and extra nesting inside eventData to stress the walkers.
+"""
+
+import random
+from datetime import datetime, timedelta, timezone
+
+EXTENSIONS = ['.com', '.ai', '.io', '.org', '.net', '.xyz', '.eth']
+EVENT_TYPES = ['NAME_TOKEN_LISTED', 'NAME_TOKEN_PURCHASED', 'NAME_TOKENIZATION_REQUESTED']
+
+def _hex(rng, length):
+    return '0x' + ''.join(rng.choice('0123456789abcdef') for _ in range(length))
+
+def _nested(rng, depth):
+    """Metadata nested depth levels deep, mixing dicts, lists and address-like strings."""
+    node = {'note': 'leaf', 'ref': _hex(rng, 40), 'values': [rng.randint(0, 1000) for _ in range(3)]}
+    for level in range(depth):
+        node = {
+            'level': level,
+            'label': f'layer-{level}',
+            'children': [node, {'hash': _hex(rng, 64)}]
+        }
+    return node
+
+def make_event(rng, event_id, nesting=0, event_type='NAME_TOKEN_LISTED'):
+    created_at = datetime(2025, 1, 1, tzinfo=timezone.utc) + timedelta(seconds=event_id)
+    name = ''.join(rng.choice('abcdefghijklmnopqrstuvwxyz') for _ in range(rng.randint(3, 15))) + rng.choice(EXTENSIONS)
+
+    event_data = {
+        'networkId': 'eip155:97476',
+        'finalized': True,
+        'txHash': _hex(rng, 64),
+        'blockNumber': str(1_000_000 + event_id),
+        'logIndex': rng.randint(0, 50),
+        'tokenAddress': _hex(rng, 40),
+        'tokenId': str(rng.getrandbits(128)),
+        'orderId': _hex(rng, 64),
+        'seller': _hex(rng, 40),
+        'payment': {
+            'price': str(rng.randint(1, 5000) * 10 ** 15),
+            'tokenAddress': '0x0000000000000000000000000000000000000000',
+            'currencySymbol': 'ETH'
+        },
+        'eventCreatedAt': created_at.isoformat().replace('+00:00', 'Z')
+    }
+    if nesting:
+        event_data['metadata'] = _nested(rng, nesting)
+
+    return {
+        'id': event_id,
+        'name': name,
+        'type': event_type,
+        'uniqueId': f'{event_id}-{rng.getrandbits(32):08x}',
+        'relayId': _hex(rng, 16),
+        'eventData': event_data
+    }
+
+def make_page(events=100, nesting=0, seed=0, mixed_types=False):
+    """A poll response with the given number of events."""
+    rng = random.Random(seed)
+    page_events = [
+        make_event(rng, index, nesting, rng.choice(EVENT_TYPES) if mixed_types else 'NAME_TOKEN_LISTED')
+        for index in range(1, events + 1)
+    ]
+    return {
+        'events': page_events,
+        'lastId': events,
+        'hasMoreEvents': False
+    }
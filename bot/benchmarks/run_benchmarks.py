@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks
+Measures events per second and peak allocations of extraction, filtering,
+rendering, the JSON walkers and streaming decoding on synthetic poll pages,
+then compares the results with the stored baseline. A run fails if any stage
+got slower or allocates more than the tolerance allows.
+
+    python benchmarks/run_benchmarks.py                    # compare with the baseline
+    python benchmarks/run_benchmarks.py --update-baseline  # record a new baseline
+"""
+
+import os
+import gc
+import sys
+import json
+import time
+import random
+import argparse
+import tracemalloc
+from pathlib import Path
+
+BOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BOT_DIR))
+# Keep the bot's per-event logging out of the measurements
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+import telegram_bot as bot
+import json_stream
+from subscriptions import SubscriberFilter
+
+from payloads import EXTENSIONS, make_page
+
+BASELINE_PATH = Path(__file__).parent / 'baseline.json'
+
+# (events per page, extra nesting depth inside eventData)
+CASES = [(10, 0), (100, 0), (1000, 0), (100, 8), (100, 32)]
+SUBSCRIBERS = 10000
+FILTERED_SUBSCRIBERS = 2000
+STREAM_CHUNK_SIZE = 16 * 1024
+
+def setup_subscribers():
+    """Register subscribers with a realistic mix of per-user filters and a default filter."""
+    rng = random.Random(1)
+    bot.subscriptions.add_subscribers(range(SUBSCRIBERS))
+    for user_id in range(FILTERED_SUBSCRIBERS):
+        low = rng.uniform(0, 3)
+        bot.subscriptions.set_filter(user_id, SubscriberFilter(
+            min_price=low,
+            max_price=low + rng.uniform(0.1, 5),
+            max_letters=rng.choice([None, 5, 8, 12]),
+            domain_extensions=rng.sample(EXTENSIONS, rng.randint(0, 2)),
+            keyword=rng.choice(['', '', 'ai', 'x'])
+        ))
+
+    bot.default_filter_predicate = bot.compile_default_filter(dict(bot.advanced_filter, min_price=0.5, enabled=True))
+
+def stages(page):
+    """Stage name -> zero-argument callable processing the whole page."""
+    events = page['events']
+    records = bot.extract_data_from_response(page)
+    body = json.dumps(page).encode()
+    last_id = page['lastId']
+
+    def stream_decode():
+        decoder = json_stream.EventStreamDecoder()
+        for start in range(0, len(body), STREAM_CHUNK_SIZE):
+            decoder.feed(body[start:start + STREAM_CHUNK_SIZE])
+        decoder.finish()
+
+    return {
+        'extract': lambda: bot.extract_data_from_response(page),
+        'filter': lambda: [bot.get_alert_recipients(record) for record in records],
+        'render': lambda: [bot.create_enhanced_message(record, last_id) for record in records],
+        'walk': lambda: (bot.extract_name_and_type(page), bot.find_all_addresses(page)),
+        'find_deep': lambda: [bot.find_token_address_deep(event) for event in events],
+        'stream_decode': stream_decode,
+    }
+
+def measure_speed(function, min_time):
+    """Best seconds per call over repeated runs lasting at least min_time."""
+    function()
+    best = float('inf')
+    runs = 0
+    # Like timeit: collect first, keep the collector out of the timed runs
+    gc.collect()
+    gc.disable()
+    try:
+        deadline = time.perf_counter() + min_time
+        while runs < 3 or time.perf_counter() < deadline:
+            started_at = time.perf_counter()
+            function()
+            best = min(best, time.perf_counter() - started_at)
+            runs += 1
+    finally:
+        gc.enable()
+    return best
+
+def measure_peak(function):
+    """Peak bytes allocated while running the function once."""
+    tracemalloc.start()
+    try:
+        baseline, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        result = function()
+        _, peak = tracemalloc.get_traced_memory()
+        del result
+    finally:
+        tracemalloc.stop()
+    return max(peak - baseline, 0)
+
+def run(min_time, rounds):
+    benchmarks = []
+    for events, nesting in CASES:
+        page = make_page(events=events, nesting=nesting)
+        for stage, function in stages(page).items():
+            benchmarks.append((f'{stage}/{events}x{nesting}', events, function))
+
+    # Rounds go over every benchmark in turn, so a slow spell on a busy machine hits one round, not one stage
+    best = {}
+    for _ in range(rounds):
+        for key, _, function in benchmarks:
+            best[key] = min(best.get(key, float('inf')), measure_speed(function, min_time))
+
+    return {
+        key: {
+            'events_per_sec': round(events / best[key], 1),
+            'peak_kib': round(measure_peak(function) / 1024, 1)
+        }
+        for key, events, function in benchmarks
+    }
+
+def compare(results, baseline, tolerance):
+    """Return a description of every result that regressed against the baseline."""
+    regressions = []
+    for key, result in results.items():
+        expected = baseline.get(key)
+        if expected is None:
+            continue
+
+        if result['events_per_sec'] < expected['events_per_sec'] * (1 - tolerance):
+            regressions.append(f"{key}: {result['events_per_sec']:.0f} events/s, baseline {expected['events_per_sec']:.0f}")
+        # Small absolute slack so tiny allocations don't flap
+        if result['peak_kib'] > expected['peak_kib'] * (1 + tolerance) + 16:
+            regressions.append(f"{key}: peak {result['peak_kib']:.1f} KiB, baseline {expected['peak_kib']:.1f} KiB")
+    return regressions
+
+def print_table(results, baseline):
+    print(f"{'benchmark':<26}{'events/s':>14}{'baseline':>14}{'peak KiB':>12}{'baseline':>12}")
+    for key, result in results.items():
+        expected = baseline.get(key, {})
+        print(f"{key:<26}{result['events_per_sec']:>14,.0f}{expected.get('events_per_sec', 0):>14,.0f}"
+              f"{result['peak_kib']:>12.1f}{expected.get('peak_kib', 0):>12.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark extraction, filtering and rendering')
+    parser.add_argument('--update-baseline', action='store_true', help='store these results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=float(os.getenv('BENCHMARK_TOLERANCE', '0.25')),
+                        help='allowed slowdown / allocation growth as a fraction (default 0.25)')
+    parser.add_argument('--min-time', type=float, default=0.1, help='seconds to spend timing each stage per round')
+    parser.add_argument('--rounds', type=int, default=5, help='rounds over all benchmarks, the best one counts')
+    args = parser.parse_args()
+
+    setup_subscribers()
+    results = run(args.min_time, args.rounds)
+    baseline = json.loads(BASELINE_PATH.read_text()) if BASELINE_PATH.exists() else {}
+    print_table(results, baseline)
+
+    if args.update_baseline or not baseline:
+        BASELINE_PATH.write_text(json.dumps(results, indent=2, sort_keys=True) + '\n')
+        print(f"\n💾 Baseline written to {BASELINE_PATH}")
+        return
+
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print(f"\n❌ {len(regressions)} regressions (tolerance {args.tolerance:.0%}):")
+        for regression in regressions:
+            print(f"  - {regression}")
+        sys.exit(1)
+
+    print(f"\n✅ No regressions against the baseline (tolerance {args.tolerance:.0%})")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+Bot logging
+Leveled logging for the bot where records are handed to a queue and written
+by a background listener thread, so the bot loop never blocks on stdout.
+Repetitive per-event debug lines are sampled.
+"""
+
+import os
+import sys
+import queue
+import atexit
+import logging
+import logging.handlers
+
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+# Keep 1 in N of each repeated per-event debug line
+LOG_SAMPLE_RATE = int(os.getenv('LOG_SAMPLE_RATE', '100'))
+LOG_FORMAT = '%(asctime)s %(levelname)s %(name)s: %(message)s'
+
+ROOT_LOGGER = 'doma'
+
+_listener = None
+
+class SamplingFilter(logging.Filter):
+    """Let through the first and then every Nth DEBUG record of each message template."""
+
+    def __init__(self, rate=LOG_SAMPLE_RATE):
+        super().__init__()
+        self.rate = max(rate, 1)
+        self._counts = {}
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG or self.rate == 1:
+            return True
+
+        # record.msg is the unformatted template, so every event shares one counter
+        count = self._counts.get(record.msg, 0)
+        self._counts[record.msg] = count + 1
+        return count % self.rate == 0
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that leaves message formatting to the listener thread."""
+
+    def prepare(self, record):
+        if record.exc_info:
+            # Tracebacks reference live frames, render them before handing off
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+def get_logger(name):
+    """Return a logger under the bot's logger hierarchy."""
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
+
+def setup_logging(level=LOG_LEVEL, sample_rate=LOG_SAMPLE_RATE):
+    """Route the bot's loggers through a queue to a background writer thread."""
+    global _listener
+    if _listener is not None:
+        return
+
+    log_queue = queue.SimpleQueue()
+
+    queue_handler = DeferredQueueHandler(log_queue)
+    # Sampling runs before enqueueing so dropped records cost no formatting
+    queue_handler.addFilter(SamplingFilter(sample_rate))
+
+    root = logging.getLogger(ROOT_LOGGER)
+    root.setLevel(level)
+    root.addHandler(queue_handler)
+    root.propagate = False
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+def stop_logging():
+    """Flush pending records and stop the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,132 @@
+"""
+Broadcast fan-out
+Sends one message to many chats concurrently while staying inside
+Telegram's global and per-chat rate limits.
+"""
+
+import os
+import time
+import asyncio
+
+from telegram.error import Forbidden, RetryAfter
+
+from bot_logging import get_logger
+
+logger = get_logger(__name__)
+
+# Telegram allows roughly 30 messages/second overall and 1 message/second per chat
+GLOBAL_RATE = float(os.getenv('TELEGRAM_GLOBAL_RATE', '30'))
+PER_CHAT_RATE = float(os.getenv('TELEGRAM_PER_CHAT_RATE', '1'))
+MAX_CONCURRENCY = int(os.getenv('BROADCAST_CONCURRENCY', '30'))
+MAX_RETRIES = int(os.getenv('BROADCAST_MAX_RETRIES', '3'))
+
+class TokenBucket:
+    """Token bucket that makes callers wait until a send is allowed."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    async def acquire(self):
+        """Wait for one token."""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def pause(self, seconds):
+        """Stop handing out tokens for the given number of seconds."""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = 0
+
+class Broadcaster:
+    """Concurrent, rate-limited sender for broadcasts to many chats."""
+
+    def __init__(self, bot, global_rate=GLOBAL_RATE, per_chat_rate=PER_CHAT_RATE,
+                 max_concurrency=MAX_CONCURRENCY, max_retries=MAX_RETRIES):
+        self.bot = bot
+        self.global_bucket = TokenBucket(global_rate)
+        self.per_chat_interval = 1 / per_chat_rate
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        # chat_id -> earliest monotonic time the next message may go out
+        self._chat_next_send = {}
+
+    async def _wait_for_chat(self, chat_id):
+        now = time.monotonic()
+        next_send = self._chat_next_send.get(chat_id, 0.0)
+        self._chat_next_send[chat_id] = max(now, next_send) + self.per_chat_interval
+
+        if next_send > now:
+            await asyncio.sleep(next_send - now)
+
+    async def send_one(self, chat_id, text, **kwargs):
+        """Send to one chat, honoring rate limits and retry_after. Returns 'sent', 'blocked' or 'failed'."""
+        async with self._semaphore:
+            for attempt in range(self.max_retries + 1):
+                await self._wait_for_chat(chat_id)
+                await self.global_bucket.acquire()
+
+                try:
+                    await self.bot.send_message(chat_id=chat_id, text=text, **kwargs)
+                    return 'sent'
+                except RetryAfter as e:
+                    # Flood control applies to the whole bot, so pause every sender
+                    logger.warning("⏳ Flood control for user %s, retrying in %ss", chat_id, e.retry_after)
+                    self.global_bucket.pause(e.retry_after)
+                except Forbidden as e:
+                    logger.info("Error sending to user %s: %s", chat_id, e)
+                    return 'blocked'
+                except Exception as e:
+                    logger.warning("Error sending to user %s: %s", chat_id, e)
+                    return 'failed'
+
+            return 'failed'
+
+    async def broadcast(self, chat_ids, text, **kwargs):
+        """Send the same message to every chat and report counts and completion time."""
+        started_at = time.monotonic()
+        chat_ids = list(chat_ids)
+        result = {
+            'sent': 0,
+            'failed': 0,
+            'blocked': [],
+            'elapsed': 0.0
+        }
+        pending = iter(chat_ids)
+
+        async def worker():
+            # Workers share one iterator, so each chat is taken exactly once
+            for chat_id in pending:
+                status = await self.send_one(chat_id, text, **kwargs)
+                if status == 'sent':
+                    result['sent'] += 1
+                elif status == 'blocked':
+                    result['blocked'].append(chat_id)
+                else:
+                    result['failed'] += 1
+
+        workers = min(self.max_concurrency, len(chat_ids))
+        await asyncio.gather(*(worker() for _ in range(workers)))
+
+        result['elapsed'] = time.monotonic() - started_at
+        return result
@@ -0,0 +1,150 @@
+"""
+Per-user alert digests
+Subscribers in digest mode get matched events buffered instead of sent one
+by one; each buffer goes out as a single combined message once its window
+expires or it reaches the configured number of events.
+"""
+
+import os
+import math
+import time
+import heapq
+import asyncio
+
+from bot_logging import get_logger
+
+logger = get_logger(__name__)
+
+DIGEST_WINDOW = float(os.getenv('DIGEST_WINDOW', '60'))
+DIGEST_MAX_EVENTS = int(os.getenv('DIGEST_MAX_EVENTS', '20'))
+
+class DigestSettings:
+    """How long a subscriber's digest collects events and how many it holds at most."""
+
+    __slots__ = ('window', 'max_events')
+
+    def __init__(self, window=DIGEST_WINDOW, max_events=DIGEST_MAX_EVENTS):
+        window, max_events = float(window), float(max_events)
+        # NaN or inf would end up as deadlines in the scheduler heap
+        if not (math.isfinite(window) and math.isfinite(max_events)):
+            raise ValueError('Digest window and max events must be finite numbers')
+        self.window = max(window, 0.0)
+        self.max_events = max(int(max_events), 1)
+
+    @classmethod
+    def from_config(cls, data):
+        return cls(
+            window=data.get('windowSeconds') or DIGEST_WINDOW,
+            max_events=data.get('maxEvents') or DIGEST_MAX_EVENTS
+        )
+
+    def to_dict(self):
+        return {
+            'window_seconds': self.window,
+            'max_events': self.max_events
+        }
+
+class DigestBuffer:
+    """Buffers matched events per digest subscriber and sends one message per window or batch."""
+
+    def __init__(self, send, render):
+        # send(user_id, text) is awaited for each digest, render(records) builds its text
+        self.send = send
+        self.render = render
+        self.settings = {}
+        self._pending = {}
+        # user_id -> monotonic time the buffer is due; the heap may hold stale entries
+        self._due = {}
+        self._deadlines = []
+        # Full buffers cut off at max_events, waiting for the next tick
+        self._ready = []
+        self._wakeup = None
+
+    def configure(self, user_id, settings):
+        self.settings[user_id] = settings
+        logger.info("📬 Digest mode on for user %s: %s", user_id, settings.to_dict())
+
+    def disable(self, user_id):
+        """Leave digest mode; anything still buffered goes out on the next tick."""
+        if self.settings.pop(user_id, None) is not None and user_id in self._pending:
+            self._cut(user_id)
+
+    def forget(self, user_id):
+        """Drop a subscriber's settings and buffered events without sending them."""
+        self.settings.pop(user_id, None)
+        self._pending.pop(user_id, None)
+        self._due.pop(user_id, None)
+        self._ready = [entry for entry in self._ready if entry[0] != user_id]
+
+    def hold(self, record, recipients):
+        """Buffer the record for digest subscribers and return the recipients to send to now."""
+        if not self.settings:
+            return recipients
+
+        immediate = []
+        now = time.monotonic()
+        for user_id in recipients:
+            settings = self.settings.get(user_id)
+            if settings is None:
+                immediate.append(user_id)
+                continue
+
+            buffered = self._pending.setdefault(user_id, [])
+            buffered.append(record)
+            if len(buffered) >= settings.max_events:
+                self._cut(user_id)
+            elif len(buffered) == 1:
+                self._schedule(user_id, now + settings.window)
+
+        return immediate
+
+    def _schedule(self, user_id, deadline):
+        if deadline < self._due.get(user_id, float('inf')):
+            self._due[user_id] = deadline
+            heapq.heappush(self._deadlines, (deadline, user_id))
+            if self._wakeup is not None:
+                self._wakeup.set()
+
+    def _cut(self, user_id):
+        """Move a user's buffer to the ready list, so later events start a new digest."""
+        self._due.pop(user_id, None)
+        self._ready.append((user_id, self._pending.pop(user_id)))
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _send(self, user_id, records):
+        try:
+            await self.send(user_id, self.render(records))
+        except Exception as e:
+            logger.warning("Error sending digest to user %s: %s", user_id, e)
+
+    def _pop_due(self, now):
+        while self._deadlines and self._deadlines[0][0] <= now:
+            deadline, user_id = heapq.heappop(self._deadlines)
+            if self._due.get(user_id) == deadline and user_id in self._pending:
+                self._cut(user_id)
+
+        due, self._ready = self._ready, []
+        return due
+
+    async def run(self):
+        """Send each digest when its window expires or its buffer fills up."""
+        self._wakeup = asyncio.Event()
+        while True:
+            timeout = self._deadlines[0][0] - time.monotonic() if self._deadlines else None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+            due = self._pop_due(time.monotonic())
+            if due:
+                await asyncio.gather(*(self._send(user_id, records) for user_id, records in due))
+
+    async def close(self):
+        """Send everything still buffered."""
+        for user_id in list(self._pending):
+            self._cut(user_id)
+        due, self._ready = self._ready, []
+        await asyncio.gather(*(self._send(user_id, records) for user_id, records in due))
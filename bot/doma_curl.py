@@ -52,6 +52,50 @@ def test_with_curl():
         print(f"❌ Error running curl: {e}")
         return False
 
+def test_with_shared_client():
+    """Test using the bot's shared pooled HTTP client"""
+    print("\n🚀 Testing with shared HTTP client (keep-alive pool)...")
+    
+    try:
+        import asyncio
+        import http_client
+        
+        headers = {
+            'Api-Key': API_KEY
+        }
+        
+        async def fetch():
+            try:
+                return await http_client.get(URL, headers=headers, timeout=15)
+            finally:
+                await http_client.aclose()
+        
+        response = asyncio.run(fetch())
+        
+        print(f"Status: {response.status_code}")
+        print(f"Response headers: {dict(response.headers)}")
+        
+        if response.status_code == 200:
+            try:
+                json_data = response.json()
+                print("✅ SUCCESS! API Response:")
+                print(json.dumps(json_data, indent=2))
+                return True
+            except json.JSONDecodeError:
+                print("✅ SUCCESS! API Response (raw):")
+                print(response.text)
+                return True
+        else:
+            print(f"❌ Error {response.status_code}: {response.text}")
+            return False
+            
+    except ImportError:
+        print("❌ httpx library not found. Install with: pip install httpx")
+        return False
+    except Exception as e:
+        print(f"❌ Error with shared HTTP client: {e}")
+        return False
+
 def test_with_requests():
     """Test using requests library (mimicking curl)"""
     print("\n🚀 Testing with requests library (mimicking curl)...")
@@ -152,11 +196,15 @@ if __name__ == "__main__":
     success = test_with_curl()
     
     if not success:
-        # Test 2: Requests library
+        # Test 2: Shared pooled client
+        success = test_with_shared_client()
+    
+    if not success:
+        # Test 3: Requests library
         success = test_with_requests()
     
     if not success:
-        # Test 3: http.client
+        # Test 4: http.client
         success = test_with_http_client()
     
     if success:
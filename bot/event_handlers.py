@@ -0,0 +1,36 @@
+"""
+Event type dispatch
+Maps each Doma event type to the functions that extract and render it, as a
+single alert or as a digest entry, so a single poll can request several event
+types and route every event with one dict lookup on event['type'].
+"""
+
+class EventHandler:
+    """Extractor (event -> EventRecord), renderer (record, last_id -> message) and digest entry renderer for one event type."""
+
+    __slots__ = ('extract', 'render', 'digest')
+
+    def __init__(self, extract, render, digest):
+        self.extract = extract
+        self.render = render
+        self.digest = digest
+
+class EventDispatcher:
+    """Registry of handlers keyed by event type, with a fallback for unregistered types."""
+
+    def __init__(self, default):
+        self.default = default
+        self.handlers = {}
+
+    def register(self, event_type, extract, render, digest):
+        self.handlers[event_type] = EventHandler(extract, render, digest)
+
+    def handler_for(self, event):
+        event_type = event.get('type') if isinstance(event, dict) else None
+        return self.handlers.get(event_type, self.default)
+
+    def extract(self, event):
+        return self.handler_for(event).extract(event)
+
+    def digest(self, record):
+        return self.handler_for(record.event).digest(record)
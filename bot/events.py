@@ -0,0 +1,53 @@
+"""
+Typed poll event records
+EventRecord holds everything extracted from one poll event, computed once
+and shared by filtering, rendering and the debug endpoints.
+"""
+
+class EventRecord:
+    """Immutable view of one extracted poll event."""
+
+    __slots__ = (
+        'event', 'event_type', 'event_id', 'created_at',
+        'name', 'domain_name', 'name_length',
+        'price', 'seller_address', 'seller_lower', 'token_address'
+    )
+
+    def __init__(self, event, event_type=None, event_id=None, created_at=None,
+                 name=None, price=None, seller_address=None, token_address=None):
+        # Normalized forms are derived here so filters never recompute them
+        domain_name = name.strip().lower() if name else ''
+        values = {
+            'event': event,
+            'event_type': event_type,
+            'event_id': event_id,
+            'created_at': created_at,
+            'name': name,
+            'domain_name': domain_name,
+            'name_length': len(domain_name),
+            'price': price,
+            'seller_address': seller_address,
+            'seller_lower': seller_address.lower() if seller_address else '',
+            'token_address': token_address
+        }
+        for field, value in values.items():
+            object.__setattr__(self, field, value)
+
+    def __setattr__(self, field, value):
+        raise AttributeError(f"EventRecord is immutable, cannot set '{field}'")
+
+    def __delattr__(self, field):
+        raise AttributeError(f"EventRecord is immutable, cannot delete '{field}'")
+
+    def __repr__(self):
+        return (f"EventRecord(name={self.name!r}, type={self.event_type!r}, price={self.price!r}, "
+                f"seller={self.seller_address!r}, token={self.token_address!r})")
+
+    def to_dict(self):
+        """Return the extracted fields in the shape the API endpoints expose."""
+        return {
+            'price': self.price,
+            'name': self.name,
+            'seller_address': self.seller_address,
+            'token_address': self.token_address
+        }
@@ -0,0 +1,140 @@
+"""
+Multi-process fan-out
+Optional pool of worker processes that deliver rendered alerts. Each worker
+owns a hash partition of the subscribers and runs its own Broadcaster, so
+message encoding and TLS work spread over several cores. The bot process
+publishes (message, chat_ids) jobs to the workers over multiprocessing queues.
+"""
+
+import os
+import time
+import asyncio
+import multiprocessing
+
+from telegram import Bot
+
+import metrics
+from bot_logging import get_logger, setup_logging
+from broadcaster import GLOBAL_RATE, Broadcaster
+
+logger = get_logger(__name__)
+
+# 0 keeps every send in the bot process
+FANOUT_WORKERS = int(os.getenv('FANOUT_WORKERS', '0'))
+
+def partition(chat_ids, workers):
+    """Split chat ids into one list per worker; a chat always maps to the same worker."""
+    parts = [[] for _ in range(workers)]
+    for chat_id in chat_ids:
+        parts[hash(chat_id) % workers].append(chat_id)
+    return parts
+
+async def _worker_loop(index, token, base_url, global_rate, jobs, results):
+    bot = Bot(token, base_url=base_url)
+    async with bot:
+        broadcaster = Broadcaster(bot, global_rate=global_rate)
+        logger.info("👷 Fan-out worker %d ready (%.1f msg/s)", index, global_rate)
+
+        while True:
+            job = await asyncio.to_thread(jobs.get)
+            if job is None:
+                break
+
+            message, chat_ids, alert_id = job
+            result = await broadcaster.broadcast(chat_ids, message)
+            results.put((index, result['sent'], result['failed'], result['blocked'], result['elapsed'], alert_id))
+
+def _worker_main(index, token, base_url, global_rate, jobs, results):
+    setup_logging()
+    try:
+        asyncio.run(_worker_loop(index, token, base_url, global_rate, jobs, results))
+    except KeyboardInterrupt:
+        pass
+
+class FanoutPool:
+    """Worker processes that each deliver alerts to their own partition of subscribers."""
+
+    def __init__(self, token, workers=FANOUT_WORKERS, global_rate=GLOBAL_RATE, base_url='https://api.telegram.org/bot'):
+        self.token = token
+        self.base_url = base_url
+        self.workers = workers
+        # Telegram's limit is per bot, so the workers share it
+        self.worker_rate = global_rate / workers
+        self._context = multiprocessing.get_context('spawn')
+        self._jobs = []
+        self._processes = []
+        self._results = None
+        # alert id -> [partitions still being delivered, monotonic publish time, eventCreatedAt or None]
+        self._alerts = {}
+        self._next_alert_id = 0
+
+    def start(self):
+        self._results = self._context.Queue()
+        for index in range(self.workers):
+            jobs = self._context.Queue()
+            process = self._context.Process(
+                target=_worker_main,
+                args=(index, self.token, self.base_url, self.worker_rate, jobs, self._results),
+                name=f'fanout-worker-{index}',
+                daemon=True
+            )
+            process.start()
+            self._jobs.append(jobs)
+            self._processes.append(process)
+
+        logger.info("🚀 Started %d fan-out workers", self.workers)
+
+    def publish(self, message, chat_ids, created_at=None):
+        """Hand each worker the chats of its partition; returns without waiting for delivery."""
+        self._next_alert_id += 1
+        parts = 0
+        for jobs, part in zip(self._jobs, partition(chat_ids, self.workers)):
+            if part:
+                jobs.put((message, part, self._next_alert_id))
+                parts += 1
+        if parts:
+            self._alerts[self._next_alert_id] = [parts, time.monotonic(), created_at]
+
+    async def collect(self, on_blocked):
+        """Log worker results and pass chats that blocked the bot to on_blocked, until closed."""
+        while True:
+            result = await asyncio.to_thread(self._results.get)
+            if result is None:
+                return
+
+            index, sent, failed, blocked, elapsed, alert_id = result
+            for chat_id in blocked:
+                on_blocked(chat_id)
+
+            metrics.TELEGRAM_SENDS.inc(sent, status='sent')
+            metrics.TELEGRAM_SENDS.inc(failed, status='failed')
+            metrics.TELEGRAM_SENDS.inc(len(blocked), status='blocked')
+            self._partition_done(alert_id)
+            logger.info("Worker %d delivered: %d success, %d failed in %.2fs", index, sent, failed + len(blocked), elapsed)
+
+    def _partition_done(self, alert_id):
+        """Record the alert's delivery timings once, when its last partition reports back."""
+        alert = self._alerts.get(alert_id)
+        if alert is None:
+            return
+        alert[0] -= 1
+        if alert[0]:
+            return
+
+        del self._alerts[alert_id]
+        _, published_at, created_at = alert
+        metrics.FANOUT_SECONDS.observe(time.monotonic() - published_at)
+        if created_at is not None:
+            metrics.END_TO_END_SECONDS.observe(time.time() - created_at)
+
+    def close(self, timeout=10):
+        """Let the workers finish their queued jobs, then stop them."""
+        for jobs in self._jobs:
+            jobs.put(None)
+        for process in self._processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+
+        if self._results is not None:
+            self._results.put(None)
@@ -0,0 +1,112 @@
+"""
+Schema-learning field resolver
+Remembers, per event type, which JSON path produced each extracted field
+(token address, price, seller). Later events of the same type go straight
+to that path; the candidate list and the deep scan only run on a miss.
+"""
+
+from bot_logging import get_logger
+from json_walker import format_path
+
+logger = get_logger(__name__)
+
+_MISSING = object()
+
+def get_path(obj, path):
+    """Follow a path of dict keys / list indices, returning _MISSING if it breaks."""
+    for step in path:
+        if isinstance(step, int):
+            if not isinstance(obj, list) or step >= len(obj):
+                return _MISSING
+        elif not isinstance(obj, dict) or step not in obj:
+            return _MISSING
+        obj = obj[step]
+    return obj
+
+class FieldSpec:
+    """How to find one field: candidate paths in priority order, a converter and a deep scan."""
+
+    def __init__(self, candidates, convert, deep_scan=None):
+        self.candidates = [tuple(path) for path in candidates]
+        # convert(raw) returns the field value, or None when the raw value is unusable
+        self.convert = convert
+        # deep_scan(event) returns (path, raw) or None
+        self.deep_scan = deep_scan
+
+class FieldResolver:
+    """Per event type cache of the JSON path that yields each field."""
+
+    def __init__(self, specs):
+        self.specs = specs
+        # (event_type, field) -> (path, found_by_deep_scan)
+        self._learned = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _try(self, event, path, convert):
+        raw = get_path(event, path)
+        if raw is _MISSING:
+            return None
+        return convert(raw)
+
+    def resolve(self, event, event_type, field):
+        """Return the field's value for this event, learning where it lives."""
+        spec = self.specs[field]
+        key = (event_type, field)
+
+        learned = self._learned.get(key)
+        learned_path, from_deep_scan = learned if learned is not None else (None, False)
+
+        # A path found by the deep scan is only a guess, the named candidates still come first
+        if learned_path is not None and not from_deep_scan:
+            value = self._try(event, learned_path, spec.convert)
+            if value is not None:
+                self.hits += 1
+                return value
+
+        for path in spec.candidates:
+            if path == learned_path:
+                continue
+            value = self._try(event, path, spec.convert)
+            if value is not None:
+                self.misses += 1
+                self._learn(key, path, False)
+                return value
+
+        if from_deep_scan:
+            value = self._try(event, learned_path, spec.convert)
+            if value is not None:
+                self.hits += 1
+                return value
+
+        self.misses += 1
+
+        if spec.deep_scan is not None:
+            found = spec.deep_scan(event)
+            if found is not None:
+                path, raw = found
+                value = spec.convert(raw)
+                if value is not None:
+                    self._learn(key, tuple(path), True)
+                    return value
+
+        return None
+
+    def _learn(self, key, path, from_deep_scan):
+        if self._learned.get(key) != (path, from_deep_scan):
+            self._learned[key] = (path, from_deep_scan)
+            logger.debug("📚 Learned %s for %s events at %s", key[1], key[0], format_path(path))
+
+    def learned_paths(self):
+        """Return {event_type: {field: path}} for the debug endpoints."""
+        snapshot = {}
+        for (event_type, field), (path, _) in self._learned.items():
+            snapshot.setdefault(str(event_type), {})[field] = format_path(path)
+        return snapshot
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'learned_paths': len(self._learned)
+        }
@@ -0,0 +1,70 @@
+"""
+Shared async HTTP client
+Keeps one pooled keep-alive httpx client per host so every outbound call
+(poller, bot handlers and API endpoints) reuses warm connections.
+"""
+
+import os
+from urllib.parse import urlsplit
+
+import httpx
+
+# Connection pool configuration (applied to each host separately)
+MAX_CONNECTIONS_PER_HOST = int(os.getenv('HTTP_MAX_CONNECTIONS_PER_HOST', '20'))
+MAX_KEEPALIVE_PER_HOST = int(os.getenv('HTTP_MAX_KEEPALIVE_PER_HOST', '10'))
+KEEPALIVE_EXPIRY = float(os.getenv('HTTP_KEEPALIVE_EXPIRY', '60'))
+DEFAULT_TIMEOUT = float(os.getenv('HTTP_DEFAULT_TIMEOUT', '10'))
+
+DEFAULT_HEADERS = {
+    'Accept-Encoding': 'gzip, deflate'
+}
+
+# host -> httpx.AsyncClient
+_clients = {}
+
+def get_client(url):
+    """Return the pooled client for the host of the given URL."""
+    host = urlsplit(url).netloc
+    client = _clients.get(host)
+
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            headers=DEFAULT_HEADERS,
+            timeout=DEFAULT_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=MAX_CONNECTIONS_PER_HOST,
+                max_keepalive_connections=MAX_KEEPALIVE_PER_HOST,
+                keepalive_expiry=KEEPALIVE_EXPIRY
+            )
+        )
+        _clients[host] = client
+
+    return client
+
+async def request(method, url, **kwargs):
+    """Send a request through the pooled client for the URL's host."""
+    return await get_client(url).request(method, url, **kwargs)
+
+async def get(url, **kwargs):
+    """Send a GET request through the shared pool."""
+    return await request('GET', url, **kwargs)
+
+async def post(url, **kwargs):
+    """Send a POST request through the shared pool."""
+    return await request('POST', url, **kwargs)
+
+async def open_stream(method, url, **kwargs):
+    """Send a request through the shared pool and return as soon as the headers arrive.
+
+    The body is left unread for aiter_bytes(); the caller must aclose() the response.
+    """
+    client = get_client(url)
+    return await client.send(client.build_request(method, url, **kwargs), stream=True)
+
+async def aclose():
+    """Close every pooled client."""
+    clients = list(_clients.values())
+    _clients.clear()
+
+    for client in clients:
+        await client.aclose()
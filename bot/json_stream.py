@@ -0,0 +1,118 @@
+"""
+Streaming JSON decoding
+Splits the events array of a poll response out of the byte stream as it
+arrives and decodes each event on its own, so extraction can start before
+the page has finished downloading. Uses orjson when it is installed.
+"""
+
+import re
+import json
+
+try:
+    import orjson
+    loads = orjson.loads
+except ImportError:
+    orjson = None
+    loads = json.loads
+
+# Outside a string only brackets, commas and quotes matter; inside one only quotes and escapes
+_STRUCTURAL = re.compile(rb'[\[\]{},"]')
+_STRING_SPECIAL = re.compile(rb'["\\]')
+
+_HEAD, _ITEMS, _TAIL = range(3)
+
+class EventStreamDecoder:
+    """Incremental decoder that yields the elements of one top-level array as they complete."""
+
+    def __init__(self, array_key='events'):
+        self._key = json.dumps(array_key).encode()
+        self._buffer = bytearray()
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._string_start = 0
+        self._last_string = b''
+        self._state = _HEAD
+        self._item_start = 0
+        # Everything outside the array, with the array itself left empty
+        self._envelope = bytearray()
+        self.count = 0
+
+    def feed(self, chunk):
+        """Consume a chunk of bytes and return the array elements completed by it."""
+        self._buffer += chunk
+        items = []
+        buffer = self._buffer
+        pos = self._pos
+
+        while True:
+            if self._in_string:
+                match = _STRING_SPECIAL.search(buffer, pos)
+                if match is None:
+                    pos = len(buffer)
+                    break
+                pos = match.start()
+                if buffer[pos] == 0x5c:  # backslash
+                    if pos + 1 >= len(buffer):
+                        # Escape split across chunks, look at it again with the next chunk
+                        break
+                    pos += 2
+                    continue
+                self._in_string = False
+                if self._state == _HEAD and self._depth == 1:
+                    self._last_string = bytes(buffer[self._string_start:pos + 1])
+                pos += 1
+                continue
+
+            match = _STRUCTURAL.search(buffer, pos)
+            if match is None:
+                pos = len(buffer)
+                break
+            pos = match.start()
+            char = buffer[pos]
+
+            if char == 0x22:  # quote
+                self._in_string = True
+                self._string_start = pos
+            elif char in (0x7b, 0x5b):  # { [
+                self._depth += 1
+                if self._state == _HEAD and self._depth == 2 and char == 0x5b and self._last_string == self._key:
+                    # Keep the envelope up to the opening bracket and start splitting elements
+                    self._envelope += buffer[:pos + 1]
+                    del buffer[:pos + 1]
+                    pos = -1
+                    self._item_start = 0
+                    self._state = _ITEMS
+            elif char in (0x7d, 0x5d):  # } ]
+                self._depth -= 1
+                if self._state == _ITEMS and self._depth == 1:
+                    self._take_item(buffer, pos, items)
+                    del buffer[:pos]
+                    pos = 0
+                    self._state = _TAIL
+            elif char == 0x2c and self._state == _ITEMS and self._depth == 2:  # , between elements
+                self._take_item(buffer, pos, items)
+                self._item_start = pos + 1
+
+            pos += 1
+
+        if self._state == _ITEMS and self._item_start:
+            # Drop the elements already decoded so only the one in flight stays buffered
+            del buffer[:self._item_start]
+            pos -= self._item_start
+            self._item_start = 0
+
+        self._pos = pos
+        return items
+
+    def _take_item(self, buffer, end, items):
+        raw = bytes(buffer[self._item_start:end])
+        if raw.strip():
+            items.append(loads(raw))
+            self.count += 1
+
+    def finish(self):
+        """Decode and return the rest of the document, with the streamed array left empty."""
+        self._envelope += self._buffer
+        self._buffer = bytearray()
+        return loads(bytes(self._envelope))
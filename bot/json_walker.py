@@ -0,0 +1,109 @@
+"""
+Iterative JSON walker
+One explicit-stack, pre-order traversal that collects name/type pairs,
+transaction hashes and addresses from an API response in a single pass.
+Paths are only built when a caller asks for them.
+"""
+
+TX_HASH_LENGTH = 66
+ADDRESS_LENGTH = 42
+
+def is_tx_hash(value):
+    return isinstance(value, str) and len(value) == TX_HASH_LENGTH and value.startswith('0x')
+
+def is_address(value):
+    return isinstance(value, str) and len(value) == ADDRESS_LENGTH and value.startswith('0x')
+
+def format_path(path):
+    """Render a path tuple as eventData.payment.price / events[0].name."""
+    rendered = ''
+    for step in path:
+        if isinstance(step, int):
+            rendered += f"[{step}]"
+        else:
+            rendered += f".{step}" if rendered else step
+    return rendered
+
+def _children(container):
+    return iter(container.items()) if isinstance(container, dict) else enumerate(container)
+
+class WalkResult:
+    """Everything walk_json() found, in document order."""
+
+    __slots__ = ('names', 'hashes', 'addresses')
+
+    def __init__(self):
+        self.names = []
+        self.hashes = []
+        self.addresses = []
+
+def walk_json(obj, collect_paths=False):
+    """Collect name/type pairs, 66-char hashes and 42-char addresses in one traversal."""
+    result = WalkResult()
+    if not isinstance(obj, (dict, list)):
+        return result
+
+    # Frames are (container, path, children iterator); path is None unless requested
+    stack = [(obj, () if collect_paths else None, _children(obj))]
+
+    while stack:
+        container, path, children = stack[-1]
+        is_dict = isinstance(container, dict)
+
+        for key, value in children:
+            if is_dict and isinstance(value, str):
+                field_path = format_path(path + (key,)) if collect_paths else None
+                lowered = key.lower() if isinstance(key, str) else key
+
+                if lowered == 'name':
+                    found = {'name': value, 'type': container.get('type', 'Unknown')}
+                elif lowered == 'type':
+                    found = {'name': container.get('name', 'Unknown'), 'type': value}
+                else:
+                    found = None
+                if found is not None:
+                    if collect_paths:
+                        found['path'] = field_path
+                    result.names.append(found)
+
+                if value.startswith('0x'):
+                    if len(value) == TX_HASH_LENGTH:
+                        target = result.hashes
+                    elif len(value) == ADDRESS_LENGTH:
+                        target = result.addresses
+                    else:
+                        target = None
+                    if target is not None:
+                        found = {'value': value, 'field_name': key}
+                        if collect_paths:
+                            found['path'] = field_path
+                        target.append(found)
+
+            elif isinstance(value, (dict, list)):
+                # Descend now to keep pre-order; this frame resumes from its iterator later
+                stack.append((value, path + (key,) if collect_paths else None, _children(value)))
+                break
+        else:
+            stack.pop()
+
+    return result
+
+def find_first(obj, predicate):
+    """Return (path, value) of the first dict value matching predicate in pre-order, or None."""
+    if not isinstance(obj, (dict, list)):
+        return None
+
+    stack = [((), _children(obj), isinstance(obj, dict))]
+
+    while stack:
+        path, children, is_dict = stack[-1]
+        for key, value in children:
+            if is_dict and predicate(value):
+                return path + (key,), value
+            if isinstance(value, (dict, list)):
+                stack.append((path + (key,), _children(value), isinstance(value, dict)))
+                break
+        else:
+            stack.pop()
+
+    return None
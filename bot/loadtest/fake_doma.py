@@ -0,0 +1,139 @@
+"""
+Fake Doma poll API
+Local stand-in for /v1/poll and /v1/poll/ack/{id}. Events are released at a
+fixed rate, either freshly generated listings or events replayed from
+recorded poll pages, and each one keeps the time it was released so the
+harness can measure delivery latency.
+"""
+
+import sys
+import copy
+import json
+import time
+import random
+from pathlib import Path
+from datetime import datetime, timezone
+
+from quart import Quart, request, jsonify
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'benchmarks'))
+from payloads import make_event
+
+def generated_events(seed=0, nesting=0, event_types=('NAME_TOKEN_LISTED',)):
+    """Event source producing synthetic listings without end."""
+    rng = random.Random(seed)
+    return lambda event_id: make_event(rng, event_id, nesting, event_types[event_id % len(event_types)])
+
+def load_recorded_events(path):
+    """Events from recorded poll pages: a JSON page, a JSON list of pages, or one page per line."""
+    text = Path(path).read_text()
+    try:
+        pages = json.loads(text)
+    except json.JSONDecodeError:
+        pages = [json.loads(line) for line in text.splitlines() if line.strip()]
+    if isinstance(pages, dict):
+        pages = [pages]
+
+    events = []
+    for page in pages:
+        # Pages saved from /api/test-api-response wrap the poll response
+        page = page.get('response', page) if isinstance(page, dict) else page
+        if isinstance(page, dict) and isinstance(page.get('events'), list):
+            events.extend(event for event in page['events'] if isinstance(event, dict))
+    return events
+
+def recorded_events(events):
+    """Event source replaying recorded events once, in order."""
+    return lambda event_id: copy.deepcopy(events[event_id - 1]) if event_id <= len(events) else None
+
+class FakeDoma:
+    """Releases events at rate per second for duration seconds and serves them like the poll API."""
+
+    def __init__(self, source, rate, duration):
+        # event id -> event dict, or None once the source has run out
+        self.source = source
+        self.rate = rate
+        self.limit = int(rate * duration)
+        self.started_at = None
+        self.events = []
+        # Events with an index below this were acked
+        self.acked = 0
+        # Domain name -> release time, to match sendMessage calls back to events
+        self.released_at = {}
+        self.polls = 0
+        self.acks = 0
+        self.exhausted = False
+
+    @property
+    def done(self):
+        return self.exhausted or len(self.events) >= self.limit
+
+    def _release(self, now):
+        due = min(int((now - self.started_at) * self.rate), self.limit)
+        while len(self.events) < due and not self.exhausted:
+            event_id = len(self.events) + 1
+            event = self.source(event_id)
+            if event is None:
+                self.exhausted = True
+                break
+
+            # Released now as far as the bot can tell, whatever a recorded page said
+            released_at = self.started_at + (event_id - 1) / self.rate
+            event['id'] = event_id
+            event_data = event.setdefault('eventData', {})
+            if isinstance(event_data, dict):
+                event_data['eventCreatedAt'] = datetime.fromtimestamp(released_at, timezone.utc).isoformat().replace('+00:00', 'Z')
+            self.events.append(event)
+            if event.get('name'):
+                self.released_at[event['name']] = released_at
+
+    def poll(self, event_types, limit):
+        self.polls += 1
+        now = time.time()
+        if self.started_at is None:
+            # The clock starts with the bot's first poll, so startup time doesn't count as backlog
+            self.started_at = now
+        self._release(now)
+
+        page = []
+        last_id = None
+        for event in self.events[self.acked:]:
+            last_id = event['id']
+            if not event_types or event.get('type') in event_types:
+                page.append(event)
+                if len(page) >= limit:
+                    break
+
+        return {
+            'events': page,
+            'lastId': last_id,
+            'hasMoreEvents': last_id is not None and last_id < len(self.events)
+        }
+
+    def ack(self, last_id):
+        self.acks += 1
+        self.acked = max(self.acked, min(last_id, len(self.events)))
+
+    def stats(self):
+        return {
+            'released': len(self.events),
+            'acked': self.acked,
+            'polls': self.polls,
+            'acks': self.acks
+        }
+
+def create_app(doma):
+    app = Quart(__name__)
+
+    @app.route('/v1/poll', methods=['GET'])
+    async def poll():
+        event_types = request.args.getlist('eventTypes')
+        limit = request.args.get('limit', 100, type=int)
+        return jsonify(doma.poll(event_types, limit))
+
+    @app.route('/v1/poll/ack/<int:last_id>', methods=['POST'])
+    async def ack(last_id):
+        doma.ack(last_id)
+        return '', 204
+
+    return app
@@ -0,0 +1,94 @@
+"""
+Fake Telegram Bot API
+Answers the Bot API methods the bot calls, records every sendMessage with the
+time it arrived, and can answer a fraction of sends with 429 and retry_after
+the way Telegram throttles a bot that sends too fast.
+"""
+
+import json
+import time
+import random
+import asyncio
+
+from quart import Quart, request, jsonify
+
+BOT_USER = {'id': 1, 'is_bot': True, 'first_name': 'Load Test', 'username': 'doma_loadtest_bot'}
+# getUpdates never has updates, but holds the long poll briefly like the real API
+LONG_POLL_SECONDS = 1
+
+class FakeTelegram:
+    """Records sendMessage calls; throttle_rate of them get a 429 with retry_after seconds."""
+
+    def __init__(self, throttle_rate=0.0, retry_after=1, seed=0):
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self._rng = random.Random(seed)
+        # (received_at, chat_id, text) per delivered message
+        self.sent = []
+        self.throttled = 0
+        self.calls = {}
+        self._message_id = 0
+
+    def send_message(self, params):
+        if self.throttle_rate and self._rng.random() < self.throttle_rate:
+            self.throttled += 1
+            return {
+                'ok': False,
+                'error_code': 429,
+                'description': f'Too Many Requests: retry after {self.retry_after}',
+                'parameters': {'retry_after': self.retry_after}
+            }, 429
+
+        chat_id = int(params['chat_id'])
+        text = params.get('text', '')
+        self.sent.append((time.time(), chat_id, text))
+        self._message_id += 1
+        return {'ok': True, 'result': {
+            'message_id': self._message_id,
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private'},
+            'from': BOT_USER,
+            'text': text
+        }}, 200
+
+    def stats(self):
+        return {
+            'sent': len(self.sent),
+            'throttled': self.throttled,
+            'calls': dict(self.calls)
+        }
+
+async def _params():
+    """Bot API parameters, sent by python-telegram-bot as a form with JSON-encoded values."""
+    if request.is_json:
+        return await request.get_json() or {}
+
+    params = {}
+    for name, value in (await request.form).items():
+        try:
+            params[name] = json.loads(value)
+        except ValueError:
+            params[name] = value
+    return params
+
+def create_app(telegram):
+    app = Quart(__name__)
+
+    @app.route('/bot<token>/<method>', methods=['GET', 'POST'])
+    async def bot_api(token, method):
+        params = await _params()
+        telegram.calls[method] = telegram.calls.get(method, 0) + 1
+
+        if method == 'sendMessage':
+            body, status = telegram.send_message(params)
+            return jsonify(body), status
+        if method == 'getMe':
+            return jsonify({'ok': True, 'result': BOT_USER})
+        if method == 'getUpdates':
+            await asyncio.sleep(min(float(params.get('timeout') or 0), LONG_POLL_SECONDS))
+            return jsonify({'ok': True, 'result': []})
+
+        # deleteWebhook, setWebhook, answerCallbackQuery, ...
+        return jsonify({'ok': True, 'result': True})
+
+    return app
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+End-to-end load test
+Runs telegram_bot.main() against a local fake of the Doma poll API and a fake
+Telegram Bot API, releases events at a fixed rate for a while, then reports
+sustained alerts per second and the latency from event release to delivery.
+
+    python loadtest/run_loadtest.py --rate 5 --duration 60 --subscribers 20
+    python loadtest/run_loadtest.py --replay pages.json --rate 20 --throttle-rate 0.02
+"""
+
+import os
+import re
+import sys
+import time
+import socket
+import signal
+import asyncio
+import argparse
+import tempfile
+import threading
+from pathlib import Path
+
+BOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BOT_DIR))
+
+from hypercorn.asyncio import serve
+from hypercorn.config import Config
+
+from fake_doma import FakeDoma, generated_events, load_recorded_events, recorded_events
+from fake_doma import create_app as create_doma_app
+from fake_telegram import FakeTelegram
+from fake_telegram import create_app as create_telegram_app
+
+BOT_TOKEN = '123456:LOADTEST'
+HOST = '127.0.0.1'
+# Alerts, purchase/tokenization messages and digest sections all start the name line with 📝
+NAME_PATTERN = re.compile(r'📝 (?:Name: )?(\S+)')
+
+class FakeServers:
+    """Serves the fake apps from a background thread with its own event loop."""
+
+    def __init__(self, apps):
+        # [(app, port)]
+        self.apps = apps
+        self._loop = None
+        self._shutdown = None
+        self._thread = None
+
+    async def _serve(self, started):
+        self._loop = asyncio.get_running_loop()
+        self._shutdown = asyncio.Event()
+        servers = []
+        for app, port in self.apps:
+            config = Config()
+            config.bind = [f'{HOST}:{port}']
+            config.accesslog = None
+            servers.append(serve(app, config, shutdown_trigger=self._shutdown.wait))
+        started.set()
+        await asyncio.gather(*servers)
+
+    def start(self, timeout=10):
+        started = threading.Event()
+        self._thread = threading.Thread(target=asyncio.run, args=(self._serve(started),), name='fake-servers', daemon=True)
+        self._thread.start()
+        started.wait(timeout)
+
+        deadline = time.monotonic() + timeout
+        for _, port in self.apps:
+            while True:
+                try:
+                    socket.create_connection((HOST, port), timeout=1).close()
+                    break
+                except OSError:
+                    if time.monotonic() > deadline:
+                        raise RuntimeError(f"Fake server on port {port} did not start")
+                    time.sleep(0.05)
+
+    def stop(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._shutdown.set)
+            self._thread.join(10)
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind((HOST, 0))
+        return sock.getsockname()[1]
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(int(fraction * len(sorted_values)), len(sorted_values) - 1)
+    return sorted_values[index]
+
+def stop_when_drained(doma, telegram, idle_seconds, drain_timeout):
+    """Interrupt the bot once every event was released and sends went quiet, or the drain timed out."""
+    done_at = None
+    while True:
+        time.sleep(0.5)
+        if not doma.done:
+            continue
+
+        now = time.time()
+        done_at = done_at or now
+        last_send = telegram.sent[-1][0] if telegram.sent else done_at
+        if now - max(last_send, done_at) >= idle_seconds or now - done_at >= drain_timeout:
+            # run_polling stops on SIGINT the same way as on Ctrl+C
+            os.kill(os.getpid(), signal.SIGINT)
+            return
+
+def report(doma, telegram, subscribers):
+    # Domain name -> delivery times
+    deliveries = {}
+    for received_at, _, text in telegram.sent:
+        for name in NAME_PATTERN.findall(text):
+            if name in doma.released_at:
+                deliveries.setdefault(name, []).append(received_at)
+
+    first_latency = sorted(min(times) - doma.released_at[name] for name, times in deliveries.items())
+    last_latency = sorted(max(times) - doma.released_at[name] for name, times in deliveries.items())
+    complete = sum(1 for times in deliveries.values() if len(times) >= subscribers)
+
+    started_at = doma.started_at or time.time()
+    finished_at = max((received_at for received_at, _, _ in telegram.sent), default=started_at)
+    window = max(finished_at - started_at, 1e-9)
+
+    print("\n📊 Load test results")
+    print(f"  Events released:        {len(doma.events)} ({doma.stats()['polls']} polls, {doma.stats()['acks']} acks)")
+    print(f"  Alerts delivered:       {len(deliveries)} ({complete} to all {subscribers} subscribers)")
+    print(f"  Messages sent:          {len(telegram.sent)} ({telegram.throttled} answered with 429)")
+    print(f"  Window:                 {window:.1f}s")
+    print(f"  Throughput:             {len(deliveries) / window:.2f} alerts/s, {len(telegram.sent) / window:.1f} messages/s")
+    for label, latencies in (('First delivery', first_latency), ('Last delivery', last_latency)):
+        print(f"  {label + ' latency:':<24}p50 {percentile(latencies, 0.5):.2f}s  p90 {percentile(latencies, 0.9):.2f}s  "
+              f"p99 {percentile(latencies, 0.99):.2f}s  max {max(latencies, default=0.0):.2f}s")
+
+def main():
+    parser = argparse.ArgumentParser(description='Drive the bot against fake Doma and Telegram APIs')
+    parser.add_argument('--rate', type=float, default=2, help='events released per second')
+    parser.add_argument('--duration', type=float, default=30, help='seconds to keep releasing events')
+    parser.add_argument('--replay', help='recorded poll pages to replay instead of generated listings')
+    parser.add_argument('--nesting', type=int, default=0, help='extra nesting depth inside generated eventData')
+    parser.add_argument('--subscribers', type=int, default=10, help='subscribers every alert is sent to')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='fraction of sendMessage calls answered with 429')
+    parser.add_argument('--retry-after', type=int, default=1, help='retry_after seconds in injected 429s')
+    parser.add_argument('--drain-timeout', type=float, default=60, help='seconds to wait for the backlog after the last event')
+    parser.add_argument('--idle', type=float, default=3, help='seconds without sends that count as drained')
+    args = parser.parse_args()
+
+    if args.replay:
+        events = load_recorded_events(args.replay)
+        print(f"📼 Replaying {len(events)} recorded events")
+        source = recorded_events(events)
+    else:
+        source = generated_events(nesting=args.nesting)
+
+    doma = FakeDoma(source, args.rate, args.duration)
+    telegram = FakeTelegram(args.throttle_rate, args.retry_after)
+    doma_port, telegram_port = free_port(), free_port()
+    servers = FakeServers([(create_doma_app(doma), doma_port), (create_telegram_app(telegram), telegram_port)])
+    servers.start()
+
+    # The bot reads its configuration at import time
+    data_dir = tempfile.TemporaryDirectory()
+    os.environ.update({
+        'TELEGRAM_BOT_TOKEN': BOT_TOKEN,
+        'TELEGRAM_API_BASE_URL': f'http://{HOST}:{telegram_port}/bot',
+        'TELEGRAM_WEBHOOK_URL': '',
+        'DOMA_API_BASE': f'http://{HOST}:{doma_port}',
+        'DOMA_POLLER_ENABLED': 'true',
+        'BOT_DB_PATH': str(Path(data_dir.name) / 'loadtest.db'),
+        'API_PORT': str(free_port())
+    })
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+    import telegram_bot
+
+    for chat_id in range(1, args.subscribers + 1):
+        telegram_bot.add_subscriber(chat_id)
+
+    print(f"🚀 Releasing {args.rate:g} events/s for {args.duration:g}s to {args.subscribers} subscribers")
+    threading.Thread(
+        target=stop_when_drained,
+        args=(doma, telegram, args.idle, args.drain_timeout),
+        name='loadtest-drain',
+        daemon=True
+    ).start()
+
+    try:
+        telegram_bot.main()
+    finally:
+        servers.stop()
+        data_dir.cleanup()
+
+    report(doma, telegram, args.subscribers)
+
+if __name__ == '__main__':
+    main()
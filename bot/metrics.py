@@ -0,0 +1,174 @@
+"""
+Metrics
+Minimal in-process counters, histograms and callback gauges rendered in the
+Prometheus text format for /api/metrics. Everything is updated on the bot's
+event loop, so no locking is needed.
+"""
+
+import math
+
+# Seconds; covers sub-millisecond extraction up to multi-minute end-to-end delays
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ''
+    rendered = ','.join(f'{name}="{str(value)}"' for name, value in pairs)
+    return '{' + rendered + '}'
+
+class Metric:
+    kind = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def _key(self, labels):
+        return tuple(labels.get(name, '') for name in self.labelnames)
+
+    def header(self):
+        return [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = self.header()
+        for key, value in sorted(self._values.items()):
+            lines.append(f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}')
+        return lines
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # label values -> [per-bucket counts, sum, count]
+        self._series = {}
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+
+        counts = series[0]
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[index] += 1
+                break
+        series[1] += value
+        series[2] += 1
+
+    def render(self):
+        lines = self.header()
+        for key, (counts, total, count) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, [('le', _format_value(bound))])
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f'{self.name}_sum{labels} {_format_value(total)}')
+            lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+class Gauge(Metric):
+    """Value read from a callback at scrape time; the callback may return a number or {label value: number}."""
+
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=(), kind=None):
+        super().__init__(name, documentation, labelnames)
+        self.function = None
+        if kind is not None:
+            self.kind = kind
+
+    def set_function(self, function):
+        self.function = function
+
+    def render(self):
+        if self.function is None:
+            return []
+        value = self.function()
+        if value is None:
+            return []
+
+        lines = self.header()
+        if isinstance(value, dict):
+            for label_value, number in sorted(value.items()):
+                lines.append(f'{self.name}{_format_labels(self.labelnames, (label_value,))} {_format_value(number)}')
+        else:
+            lines.append(f'{self.name} {_format_value(value)}')
+        return lines
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+REGISTRY = Registry()
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Pipeline stages: Doma request -> extraction -> filtering -> fan-out
+DOMA_REQUEST_SECONDS = REGISTRY.register(Histogram(
+    'doma_request_seconds', 'Time to fetch and decode one Doma page: polls (buffered, streaming) and on-demand lookups', ['mode']))
+DOMA_POLLS = REGISTRY.register(Counter(
+    'doma_polls_total', 'Doma poll cycles by result', ['result']))
+EVENTS = REGISTRY.register(Counter(
+    'doma_events_total', 'Events processed by filter result', ['result']))
+EXTRACT_SECONDS = REGISTRY.register(Histogram(
+    'event_extract_seconds', 'Time to extract one event into an EventRecord'))
+FILTER_SECONDS = REGISTRY.register(Histogram(
+    'event_filter_seconds', 'Time to match one event against the default and subscriber filters'))
+FANOUT_SECONDS = REGISTRY.register(Histogram(
+    'broadcast_seconds', 'Time to deliver one alert to all of its recipients'))
+TELEGRAM_SENDS = REGISTRY.register(Counter(
+    'telegram_sends_total', 'Telegram messages by delivery status', ['status']))
+END_TO_END_SECONDS = REGISTRY.register(Histogram(
+    'alert_end_to_end_seconds', 'Delay from eventCreatedAt to the last delivery of the alert'))
+CACHE_REQUESTS = REGISTRY.register(Counter(
+    'cache_requests_total', 'Cached lookups by cache and result (hit, miss or coalesced into an in-flight miss)', ['cache', 'result']))
+UPSTREAM_RETRIES = REGISTRY.register(Counter(
+    'upstream_retries_total', 'Upstream calls retried after an error or 5xx/429 response', ['upstream']))
+UPSTREAM_HEDGES = REGISTRY.register(Counter(
+    'upstream_hedges_total', 'Hedged upstream calls by which request answered first', ['upstream', 'winner']))
+
+# Read at scrape time
+ALERT_QUEUE_DEPTH = REGISTRY.register(Gauge(
+    'alert_queue_depth', 'Alerts waiting to be sent'))
+ALERT_QUEUE_OLDEST_AGE = REGISTRY.register(Gauge(
+    'alert_queue_oldest_age_seconds', 'Time the oldest queued alert has been waiting'))
+ALERT_QUEUE_OVERFLOWS = REGISTRY.register(Gauge(
+    'alert_queue_overflows_total', 'Alerts rejected, dropped or coalesced by the queue policy', ['action'], kind='counter'))
+UPSTREAM_CIRCUIT_OPEN = REGISTRY.register(Gauge(
+    'upstream_circuit_open', '1 while the circuit breaker fails calls fast, 0.5 while a trial call is allowed', ['upstream']))
+SUBSCRIBERS = REGISTRY.register(Gauge(
+    'subscribers', 'Registered subscribers'))
@@ -0,0 +1,137 @@
+"""
+Durable poll state
+Remembers the last polled lastId (and whether it was acked) plus the ids of
+recently processed events, so a restart resumes where it stopped and the
+same listing is never broadcast twice.
+"""
+
+import os
+import time
+import threading
+from collections import OrderedDict
+
+from bot_logging import get_logger
+from subscriber_store import DB_PATH, connect
+
+logger = get_logger(__name__)
+
+# Recent event ids kept in memory; duplicates are only ever replays of recent pages
+SEEN_CACHE_SIZE = int(os.getenv('SEEN_EVENTS_CACHE_SIZE', '10000'))
+# Event ids kept on disk to rebuild the cache after a restart
+SEEN_TABLE_LIMIT = int(os.getenv('SEEN_EVENTS_TABLE_LIMIT', '50000'))
+
+def event_key(event):
+    """Return a stable id for a poll event, or None if it has none."""
+    if not isinstance(event, dict):
+        return None
+
+    for field in ('id', 'uniqueId', 'eventId'):
+        if event.get(field) is not None:
+            return str(event[field])
+
+    event_data = event.get('eventData') if isinstance(event.get('eventData'), dict) else {}
+    tx_hash = event.get('txHash') or event_data.get('txHash')
+    if tx_hash:
+        return f"{tx_hash}:{event.get('type')}:{event.get('name')}"
+
+    return None
+
+class PollState:
+    """Persisted poll cursor plus an LRU of processed event ids backed by SQLite."""
+
+    def __init__(self, path=DB_PATH, cache_size=SEEN_CACHE_SIZE, table_limit=SEEN_TABLE_LIMIT):
+        self.path = path
+        self.cache_size = cache_size
+        self.table_limit = table_limit
+        self.last_id = None
+        self.acked = True
+        # Only touched on the event loop, so claim_new() and unseen() never wait on disk I/O
+        self._seen = OrderedDict()
+        self._conn = None
+        # Guards _conn: save() and close() run in worker threads
+        self._lock = threading.Lock()
+
+    def open(self):
+        """Create the tables and load the cursor and recent event ids."""
+        self._conn = connect(self.path)
+        with self._conn:
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS poll_cursor ('
+                'id INTEGER PRIMARY KEY CHECK (id = 1), '
+                'last_id TEXT, '
+                'acked INTEGER NOT NULL, '
+                'updated_at REAL NOT NULL)'
+            )
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS seen_events ('
+                'seq INTEGER PRIMARY KEY AUTOINCREMENT, '
+                'event_id TEXT NOT NULL UNIQUE)'
+            )
+
+        row = self._conn.execute('SELECT last_id, acked FROM poll_cursor WHERE id = 1').fetchone()
+        if row is not None:
+            self.last_id, self.acked = row[0], bool(row[1])
+
+        recent = self._conn.execute(
+            'SELECT event_id FROM seen_events ORDER BY seq DESC LIMIT ?', (self.cache_size,)
+        ).fetchall()
+        for (event_id,) in reversed(recent):
+            self._seen[event_id] = None
+
+        logger.info("📍 Poll state loaded: lastId=%s acked=%s, %d recent events", self.last_id, self.acked, len(self._seen))
+
+    def claim_new(self, events):
+        """Return the events not processed before and mark them as seen, in O(1) per event."""
+        new_events = []
+        new_ids = []
+
+        for event in events:
+            key = event_key(event)
+            if key is None:
+                new_events.append(event)
+                continue
+            if key in self._seen:
+                self._seen.move_to_end(key)
+                continue
+
+            self._seen[key] = None
+            new_events.append(event)
+            new_ids.append(key)
+
+        while len(self._seen) > self.cache_size:
+            self._seen.popitem(last=False)
+
+        return new_events, new_ids
+
+    def unseen(self, events):
+        """Return the events not processed before, without marking them as seen."""
+        return [event for event in events if (key := event_key(event)) is None or key not in self._seen]
+
+    def save(self, last_id=None, acked=True, new_ids=()):
+        """Persist newly seen event ids and the cursor in one transaction."""
+        if self._conn is None:
+            return
+
+        with self._lock, self._conn:
+            if new_ids:
+                self._conn.executemany(
+                    'INSERT OR IGNORE INTO seen_events (event_id) VALUES (?)', [(key,) for key in new_ids]
+                )
+                # Keep the table bounded to the most recent ids
+                self._conn.execute(
+                    'DELETE FROM seen_events WHERE seq <= (SELECT MAX(seq) FROM seen_events) - ?',
+                    (self.table_limit,)
+                )
+
+            if last_id is not None:
+                self._conn.execute(
+                    'INSERT OR REPLACE INTO poll_cursor (id, last_id, acked, updated_at) VALUES (1, ?, ?, ?)',
+                    (str(last_id), int(acked), time.time())
+                )
+                self.last_id, self.acked = str(last_id), acked
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
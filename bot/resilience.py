@@ -0,0 +1,277 @@
+"""
+Resilient upstream calls
+Wraps calls to an upstream API with jittered exponential backoff, a circuit
+breaker that fails fast while the upstream is down, and optional hedged
+requests that fire a second attempt when the first is slower than the
+recent p95.
+"""
+
+import os
+import math
+import time
+import random
+import asyncio
+from collections import deque
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+import httpx
+
+import metrics
+from bot_logging import get_logger
+
+logger = get_logger(__name__)
+
+RETRY_ATTEMPTS = int(os.getenv('DOMA_RETRY_ATTEMPTS', '3'))
+RETRY_BASE_DELAY = float(os.getenv('DOMA_RETRY_BASE_DELAY', '0.2'))
+RETRY_MAX_DELAY = float(os.getenv('DOMA_RETRY_MAX_DELAY', '5'))
+# Consecutive failed attempts that open the breaker, and how long it stays open before a trial call
+BREAKER_FAILURES = int(os.getenv('DOMA_BREAKER_FAILURES', '5'))
+BREAKER_RESET_SECONDS = float(os.getenv('DOMA_BREAKER_RESET_SECONDS', '30'))
+HEDGE_ENABLED = os.getenv('DOMA_HEDGE_ENABLED', 'false').lower() == 'true'
+# Latencies needed before the p95 is trusted as the hedge delay
+HEDGE_MIN_SAMPLES = 20
+LATENCY_WINDOW = 200
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+# Breaker state as exported by the upstream_circuit_open gauge
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 0.5, OPEN: 1}
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the upstream while the breaker is open."""
+
+    def __init__(self, name, retry_in):
+        super().__init__(f"{name} circuit open, retrying in {retry_in:.0f}s")
+        self.retry_in = retry_in
+
+class CircuitBreaker:
+    """Opens after consecutive failures, then lets one trial call through after reset_seconds."""
+
+    def __init__(self, failure_threshold=BREAKER_FAILURES, reset_seconds=BREAKER_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.open_count = 0
+        self._trial_in_flight = False
+
+    def retry_in(self):
+        if self.state != OPEN:
+            return 0.0
+        return max(self.opened_at + self.reset_seconds - time.monotonic(), 0.0)
+
+    def allow(self):
+        """Whether a call may go out now."""
+        if self.state == OPEN and self.retry_in() == 0:
+            self.state = HALF_OPEN
+            self._trial_in_flight = False
+
+        if self.state == HALF_OPEN:
+            # Only one trial at a time; everyone else keeps failing fast until it succeeds
+            if self._trial_in_flight:
+                return False
+            self._trial_in_flight = True
+            return True
+
+        return self.state == CLOSED
+
+    def release_trial(self):
+        """A trial call was abandoned without a result; let the next caller try instead."""
+        self._trial_in_flight = False
+
+    def record_success(self):
+        if self.state != CLOSED:
+            logger.info("✅ Circuit closed again")
+        self.state = CLOSED
+        self.failures = 0
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != OPEN:
+                self.open_count += 1
+                logger.warning("🔌 Circuit opened after %d failures, failing fast for %.0fs", self.failures, self.reset_seconds)
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+    def stats(self):
+        return {
+            'state': self.state,
+            'consecutive_failures': self.failures,
+            'retry_in_seconds': round(self.retry_in(), 1),
+            'times_opened': self.open_count
+        }
+
+class LatencyWindow:
+    """Recent successful call latencies, for the hedge delay."""
+
+    def __init__(self, size=LATENCY_WINDOW):
+        self._samples = deque(maxlen=size)
+
+    def add(self, seconds):
+        self._samples.append(seconds)
+
+    def percentile(self, fraction):
+        if len(self._samples) < HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+def backoff_delay(attempt, base=RETRY_BASE_DELAY, cap=RETRY_MAX_DELAY):
+    """Full-jitter exponential backoff before retry number attempt (0-based)."""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+def is_retryable(response):
+    """Server errors and throttling are worth retrying; other statuses mean the upstream answered."""
+    return response.status_code >= 500 or response.status_code == 429
+
+def retry_after_delay(response):
+    """Seconds the upstream asked to wait in Retry-After (seconds or an HTTP date), or None."""
+    value = response.headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            when = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        if when.tzinfo is None:
+            when = when.replace(tzinfo=timezone.utc)
+        seconds = (when - datetime.now(timezone.utc)).total_seconds()
+    return max(seconds, 0.0) if math.isfinite(seconds) else None
+
+class Resilience:
+    """Retries, circuit breaker and hedging for the calls to one upstream."""
+
+    def __init__(self, name, attempts=RETRY_ATTEMPTS, breaker=None, hedge=HEDGE_ENABLED):
+        self.name = name
+        self.attempts = max(attempts, 1)
+        self.breaker = breaker or CircuitBreaker()
+        self.hedge = hedge
+        self.latencies = LatencyWindow()
+
+    def acquire(self):
+        """Raise CircuitOpenError unless the breaker lets a call go out now."""
+        if not self.breaker.allow():
+            raise CircuitOpenError(self.name, self.breaker.retry_in())
+
+    def record(self, response):
+        """Feed a response into the breaker: 5xx/429 count as failures, anything else as success."""
+        if is_retryable(response):
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+
+    def hedge_delay(self):
+        return self.latencies.percentile(0.95) if self.hedge else None
+
+    async def call(self, send, hedge=False):
+        """Await send() (returning an httpx response) with retries; hedge only idempotent requests.
+
+        Returns the last response, which may still carry an error status once
+        the attempts are used up. Raises CircuitOpenError while the breaker is
+        open, or the last transport error.
+        """
+        for attempt in range(self.attempts):
+            self.acquire()
+
+            last_attempt = attempt == self.attempts - 1
+            delay = backoff_delay(attempt)
+            try:
+                response = await (self._hedged(send) if hedge else self._timed(send))
+            except httpx.TransportError as e:
+                self.breaker.record_failure()
+                if last_attempt:
+                    raise
+                logger.debug("%s attempt %d failed: %s", self.name, attempt + 1, e)
+            except asyncio.CancelledError:
+                self.breaker.release_trial()
+                raise
+            except Exception:
+                self.breaker.record_failure()
+                raise
+            else:
+                self.record(response)
+                if not is_retryable(response) or last_attempt:
+                    return response
+
+                # A throttled upstream says how long to back off; retrying sooner only gets another 429
+                retry_after = retry_after_delay(response)
+                if retry_after is not None:
+                    if retry_after > RETRY_MAX_DELAY:
+                        logger.debug("%s asked to retry in %.0fs, giving up", self.name, retry_after)
+                        return response
+                    delay = max(delay, retry_after)
+                logger.debug("%s attempt %d got HTTP %s", self.name, attempt + 1, response.status_code)
+                # Frees the connection of a streamed response, a no-op for read ones
+                await response.aclose()
+
+            metrics.UPSTREAM_RETRIES.inc(upstream=self.name)
+            await asyncio.sleep(delay)
+
+    async def _timed(self, send):
+        started_at = time.perf_counter()
+        response = await send()
+        if not is_retryable(response):
+            self.latencies.add(time.perf_counter() - started_at)
+        return response
+
+    async def _hedged(self, send):
+        delay = self.hedge_delay()
+        if delay is None:
+            return await self._timed(send)
+
+        first = asyncio.ensure_future(self._timed(send))
+        pending = {first}
+        try:
+            done, _ = await asyncio.wait(pending, timeout=delay)
+            if done:
+                return first.result()
+
+            # Slower than 95% of recent calls: race a second request and keep the first usable answer
+            second = asyncio.ensure_future(self._timed(send))
+            pending.add(second)
+            # Tasks that answered with a 5xx/429, in case the other one does no better
+            retryable = []
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        continue
+                    if is_retryable(task.result()):
+                        retryable.append(task)
+                        continue
+                    metrics.UPSTREAM_HEDGES.inc(upstream=self.name, winner='hedge' if task is second else 'original')
+                    await self._discard(retryable)
+                    return task.result()
+
+            if not retryable:
+                # Both failed, surface the original's error
+                return first.result()
+            # Neither answered usefully; hand one error response back so call() can retry
+            kept = first if first in retryable else retryable[0]
+            await self._discard([task for task in retryable if task is not kept])
+            return kept.result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    @staticmethod
+    async def _discard(tasks):
+        for task in tasks:
+            await task.result().aclose()
+
+    def stats(self):
+        delay = self.hedge_delay()
+        return dict(
+            self.breaker.stats(),
+            hedging=self.hedge,
+            hedge_delay_seconds=round(delay, 3) if delay is not None else None
+        )
@@ -0,0 +1,69 @@
+"""
+Single-flight TTL cache
+Keeps results of an async lookup for a few seconds and lets concurrent
+callers for the same key share one in-flight call, so upstream load no
+longer grows with the number of people asking at once.
+"""
+
+import time
+import asyncio
+
+import metrics
+
+class SingleFlightCache:
+    """Results cached for ttl seconds per key; concurrent misses wait on one fetch."""
+
+    def __init__(self, name, ttl, cacheable=lambda value: True):
+        self.name = name
+        self.ttl = ttl
+        # Failures are shared with the callers already waiting but never stored
+        self.cacheable = cacheable
+        # key -> (expires_at, value)
+        self._entries = {}
+        # key -> task fetching it
+        self._in_flight = {}
+        self.counts = {'hit': 0, 'miss': 0, 'coalesced': 0}
+
+    async def get(self, key, fetch):
+        """Return the cached value for key, or await fetch() shared with every concurrent caller.
+
+        Values are shared between callers, so treat them as read-only.
+        """
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            self._count('hit')
+            return entry[1]
+
+        task = self._in_flight.get(key)
+        if task is None:
+            self._count('miss')
+            task = self._in_flight[key] = asyncio.ensure_future(self._fetch(key, fetch))
+        else:
+            self._count('coalesced')
+
+        # One caller giving up (a client disconnecting) must not cancel the fetch for the others
+        return await asyncio.shield(task)
+
+    async def _fetch(self, key, fetch):
+        try:
+            value = await fetch()
+            if self.ttl > 0 and self.cacheable(value):
+                now = time.monotonic()
+                self._entries = {k: entry for k, entry in self._entries.items() if entry[0] > now}
+                self._entries[key] = (now + self.ttl, value)
+            return value
+        finally:
+            del self._in_flight[key]
+
+    def _count(self, result):
+        self.counts[result] += 1
+        metrics.CACHE_REQUESTS.inc(cache=self.name, result=result)
+
+    def stats(self):
+        return {
+            'ttl_seconds': self.ttl,
+            'hits': self.counts['hit'],
+            'misses': self.counts['miss'],
+            'coalesced': self.counts['coalesced'],
+            'in_flight': len(self._in_flight)
+        }
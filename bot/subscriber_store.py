@@ -0,0 +1,171 @@
+"""
+Persistent subscriber store
+Keeps the subscriber roster, personal filters and digest settings in SQLite
+(WAL mode). Changes are buffered in memory and written behind in batches by a
+background task, and each table is loaded back with one query at startup.
+"""
+
+import os
+import json
+import time
+import asyncio
+import sqlite3
+import threading
+from pathlib import Path
+
+from bot_logging import get_logger
+
+logger = get_logger(__name__)
+
+DB_PATH = os.getenv('BOT_DB_PATH', str(Path(__file__).parent / 'bot_data.db'))
+FLUSH_INTERVAL = float(os.getenv('SUBSCRIBER_FLUSH_INTERVAL', '2'))
+FLUSH_BATCH_SIZE = int(os.getenv('SUBSCRIBER_FLUSH_BATCH_SIZE', '500'))
+
+def connect(path=DB_PATH):
+    """Open a SQLite connection in WAL mode, shared by the bot's stores."""
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.execute('PRAGMA journal_mode=WAL')
+    # WAL makes NORMAL durable across application crashes, only power loss can drop the last commit
+    conn.execute('PRAGMA synchronous=NORMAL')
+    return conn
+
+class SubscriberStore:
+    """SQLite-backed subscriber roster, filters and digest settings with write-behind batching."""
+
+    def __init__(self, path=DB_PATH, flush_interval=FLUSH_INTERVAL, batch_size=FLUSH_BATCH_SIZE):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._conn = None
+        # user_id -> True (add) / False (remove); the latest change wins
+        self._pending = {}
+        # user_id -> filter dict / digest (window, max_events), or None to delete it
+        self._pending_filters = {}
+        self._pending_digests = {}
+        self._batch_full = None
+        # Writes run in worker threads and may outlive a cancelled flush, so guard the connection
+        self._conn_lock = threading.Lock()
+
+    def open(self):
+        self._conn = connect(self.path)
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS subscribers ('
+            'user_id INTEGER PRIMARY KEY, '
+            'added_at REAL NOT NULL)'
+        )
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS subscriber_filters ('
+            'user_id INTEGER PRIMARY KEY, '
+            'filter TEXT NOT NULL)'
+        )
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS digest_settings ('
+            'user_id INTEGER PRIMARY KEY, '
+            'window_seconds REAL NOT NULL, '
+            'max_events INTEGER NOT NULL)'
+        )
+        self._conn.commit()
+
+    def load(self):
+        """Return every stored subscriber id in one query."""
+        return {row[0] for row in self._conn.execute('SELECT user_id FROM subscribers')}
+
+    def load_filters(self):
+        """Return {user_id: filter dict} for every stored personal filter."""
+        return {user_id: json.loads(data) for user_id, data in self._conn.execute('SELECT user_id, filter FROM subscriber_filters')}
+
+    def load_digests(self):
+        """Return {user_id: (window_seconds, max_events)} for every subscriber in digest mode."""
+        return {row[0]: row[1:] for row in self._conn.execute('SELECT user_id, window_seconds, max_events FROM digest_settings')}
+
+    def add(self, user_id):
+        self._pending[user_id] = True
+        self._notify_if_full()
+
+    def remove(self, user_id):
+        # A removed subscriber's filter and digest settings go with them
+        self._pending[user_id] = False
+        self._pending_filters[user_id] = None
+        self._pending_digests[user_id] = None
+        self._notify_if_full()
+
+    def set_filter(self, user_id, filter_dict):
+        """Store a personal filter (SubscriberFilter.to_dict()), or delete it with None."""
+        self._pending_filters[user_id] = filter_dict
+        self._notify_if_full()
+
+    def set_digest(self, user_id, window_seconds=None, max_events=None):
+        """Store digest settings, or delete them when called without any."""
+        self._pending_digests[user_id] = (window_seconds, max_events) if window_seconds is not None else None
+        self._notify_if_full()
+
+    def _pending_count(self):
+        return len(self._pending) + len(self._pending_filters) + len(self._pending_digests)
+
+    def _notify_if_full(self):
+        if self._batch_full is not None and self._pending_count() >= self.batch_size:
+            self._batch_full.set()
+
+    def _write(self, batch, filters, digests):
+        now = time.time()
+        added = [(user_id, now) for user_id, is_added in batch.items() if is_added]
+        removed = [(user_id,) for user_id, is_added in batch.items() if not is_added]
+        # json keeps an open price range as Infinity, which json.loads reads back
+        stored_filters = [(user_id, json.dumps(data)) for user_id, data in filters.items() if data is not None]
+        stored_digests = [(user_id, *settings) for user_id, settings in digests.items() if settings is not None]
+
+        with self._conn_lock, self._conn:
+            if added:
+                self._conn.executemany('INSERT OR IGNORE INTO subscribers (user_id, added_at) VALUES (?, ?)', added)
+            if removed:
+                self._conn.executemany('DELETE FROM subscribers WHERE user_id = ?', removed)
+            if filters:
+                self._conn.executemany('DELETE FROM subscriber_filters WHERE user_id = ?', [(user_id,) for user_id in filters])
+                self._conn.executemany('INSERT INTO subscriber_filters (user_id, filter) VALUES (?, ?)', stored_filters)
+            if digests:
+                self._conn.executemany('DELETE FROM digest_settings WHERE user_id = ?', [(user_id,) for user_id in digests])
+                self._conn.executemany(
+                    'INSERT INTO digest_settings (user_id, window_seconds, max_events) VALUES (?, ?, ?)', stored_digests
+                )
+
+        logger.debug("💾 Stored %d new and %d removed subscribers, %d filter and %d digest changes",
+                     len(added), len(removed), len(filters), len(digests))
+
+    async def flush(self):
+        """Write all pending changes in one transaction off the event loop."""
+        if not self._pending_count():
+            return
+
+        # Swap the buffers first so changes made during the write land in the next batch
+        batch, filters, digests = self._pending, self._pending_filters, self._pending_digests
+        self._pending, self._pending_filters, self._pending_digests = {}, {}, {}
+        try:
+            await asyncio.to_thread(self._write, batch, filters, digests)
+        except Exception as e:
+            logger.error("❌ Failed to store subscribers: %s", e)
+            # Put the batches back without overriding anything that changed meanwhile
+            batch.update(self._pending)
+            filters.update(self._pending_filters)
+            digests.update(self._pending_digests)
+            self._pending, self._pending_filters, self._pending_digests = batch, filters, digests
+
+    async def run(self):
+        """Flush pending changes every interval, or sooner when a batch fills up."""
+        self._batch_full = asyncio.Event()
+        while True:
+            try:
+                await asyncio.wait_for(self._batch_full.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._batch_full.clear()
+            await self.flush()
+
+    def _close(self):
+        with self._conn_lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    async def close(self):
+        await self.flush()
+        await asyncio.to_thread(self._close)
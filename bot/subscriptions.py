@@ -0,0 +1,330 @@
+"""
+Per-subscriber alert filters
+Each subscriber can own a filter (price range, max letters, extensions,
+keyword, seller). SubscriptionIndex finds every subscriber whose filter
+matches an event through indexes instead of checking filters one by one.
+"""
+
+import math
+import re
+from bisect import bisect_left, bisect_right
+
+# Seller filters that are a full 0x address can be hash-indexed
+ADDRESS_LENGTH = 42
+ADDRESS_PATTERN = re.compile(r'0x[0-9a-f]{40}')
+
+def seller_addresses(seller):
+    """Every 42-char window of a lowercased seller that starts at a '0x'."""
+    start = seller.find('0x')
+    while start != -1 and start + ADDRESS_LENGTH <= len(seller):
+        yield seller[start:start + ADDRESS_LENGTH]
+        start = seller.find('0x', start + 1)
+
+class SubscriberFilter:
+    """One subscriber's filter, with the same rules as the global advanced filter."""
+
+    def __init__(self, min_price=0, max_price=float('inf'), max_letters=None,
+                 domain_extensions=(), keyword='', seller_address=''):
+        self.min_price = float(min_price) if min_price is not None else 0
+        self.max_price = float(max_price) if max_price is not None else float('inf')
+        # NaN compares false against everything, so no price range could be built from it
+        if math.isnan(self.min_price) or math.isnan(self.max_price):
+            raise ValueError("minPrice and maxPrice must be numbers")
+        self.max_letters = int(max_letters) if max_letters else None
+        self.domain_extensions = tuple(ext.lower() for ext in domain_extensions or () if ext)
+        self.keyword = (keyword or '').lower()
+        self.seller_address = (seller_address or '').lower()
+        # Compiled once, matches(record) is called for every event
+        self.matches = self.compile()
+
+    @classmethod
+    def from_config(cls, data):
+        """Build a filter from a /api/configure-filter payload."""
+        return cls(
+            min_price=data.get('minPrice', 0),
+            max_price=data.get('maxPrice', float('inf')),
+            max_letters=data.get('maxLetters'),
+            domain_extensions=data.get('domainExtensions', []),
+            keyword=data.get('keyword', ''),
+            seller_address=data.get('sellerAddress', '')
+        )
+
+    @property
+    def has_price_range(self):
+        return self.min_price > 0 or self.max_price < float('inf')
+
+    def compile(self):
+        """Build a predicate over EventRecords that only runs the active checks."""
+        checks = []
+
+        if self.has_price_range:
+            min_price, max_price = self.min_price, self.max_price
+            checks.append(lambda record: record.price is not None and min_price <= record.price <= max_price)
+
+        # Name checks only apply when the event has a name
+        if self.max_letters:
+            max_letters = self.max_letters
+            checks.append(lambda record: not record.domain_name or record.name_length <= max_letters)
+
+        if self.domain_extensions:
+            extensions = self.domain_extensions
+            checks.append(lambda record: not record.domain_name or record.domain_name.endswith(extensions))
+
+        if self.keyword:
+            keyword = self.keyword
+            checks.append(lambda record: not record.domain_name or keyword in record.domain_name)
+
+        # Seller check only applies when the event has a seller
+        if self.seller_address:
+            seller_address = self.seller_address
+            checks.append(lambda record: not record.seller_lower or seller_address in record.seller_lower)
+
+        if not checks:
+            return lambda record: True
+        if len(checks) == 1:
+            return checks[0]
+
+        checks = tuple(checks)
+        return lambda record: all(check(record) for check in checks)
+
+    def to_dict(self):
+        return {
+            'min_price': self.min_price,
+            'max_price': self.max_price,
+            'max_letters': self.max_letters,
+            'domain_extensions': list(self.domain_extensions),
+            'keyword': self.keyword,
+            'seller_address': self.seller_address
+        }
+
+class IntervalIndex:
+    """Centered interval tree answering "which intervals contain this point"."""
+
+    def __init__(self):
+        self._intervals = {}
+        self._root = None
+        self._dirty = False
+
+    def __len__(self):
+        return len(self._intervals)
+
+    def add(self, key, low, high):
+        if low > high:
+            # An empty range can never contain a point
+            self.remove(key)
+            return
+        self._intervals[key] = (low, high)
+        self._dirty = True
+
+    def remove(self, key):
+        if self._intervals.pop(key, None) is not None:
+            self._dirty = True
+
+    def _build(self, intervals):
+        # Node layout: (center, lows, keys_by_low, negated_highs, keys_by_high, left, right)
+        if not intervals:
+            return None
+
+        endpoints = sorted(point for low, high, _ in intervals for point in (low, high))
+        center = endpoints[len(endpoints) // 2]
+        left, right, here = [], [], []
+
+        for interval in intervals:
+            if interval[1] < center:
+                left.append(interval)
+            elif interval[0] > center:
+                right.append(interval)
+            else:
+                here.append(interval)
+
+        by_low = sorted(here, key=lambda interval: interval[0])
+        by_high = sorted(here, key=lambda interval: -interval[1])
+        return (
+            center,
+            [low for low, _, _ in by_low],
+            [key for _, _, key in by_low],
+            [-high for _, high, _ in by_high],
+            [key for _, _, key in by_high],
+            self._build(left),
+            self._build(right)
+        )
+
+    def stab(self, point):
+        """Return the keys of every interval containing point."""
+        if self._dirty:
+            self._root = self._build([(low, high, key) for key, (low, high) in self._intervals.items()])
+            self._dirty = False
+
+        found = set()
+        node = self._root
+
+        while node is not None:
+            center, lows, keys_by_low, negated_highs, keys_by_high, left, right = node
+            if point < center:
+                # Every interval here reaches the center, so only the low end matters
+                found.update(keys_by_low[:bisect_right(lows, point)])
+                node = left
+            elif point > center:
+                found.update(keys_by_high[:bisect_right(negated_highs, -point)])
+                node = right
+            else:
+                found.update(keys_by_low)
+                break
+
+        return found
+
+class SubscriptionIndex:
+    """Subscriber roster plus indexes over their personal filters."""
+
+    def __init__(self):
+        self.filters = {}
+        # Subscribers without a personal filter follow the default filter
+        self.default_users = set()
+
+        self._price = IntervalIndex()
+        self._price_any = set()
+        self._extensions = {}
+        self._extension_lengths = []
+        self._extensions_any = set()
+        self._letter_buckets = {}
+        self._letter_keys = []
+        self._letters_any = set()
+        self._sellers = {}
+        self._seller_partial = {}
+        self._sellers_any = set()
+        self._keywords = {}
+
+    def __contains__(self, user_id):
+        return user_id in self.default_users or user_id in self.filters
+
+    def add_subscriber(self, user_id):
+        if user_id not in self.filters:
+            self.default_users.add(user_id)
+
+    def add_subscribers(self, user_ids):
+        """Bulk add, used when restoring the roster at startup."""
+        self.default_users.update(user_id for user_id in user_ids if user_id not in self.filters)
+
+    def remove_subscriber(self, user_id):
+        self.default_users.discard(user_id)
+        self.clear_filter(user_id)
+
+    def set_filter(self, user_id, subscriber_filter):
+        """Give a subscriber their own filter, replacing any previous one."""
+        self.clear_filter(user_id)
+        self.default_users.discard(user_id)
+        self.filters[user_id] = subscriber_filter
+
+        if subscriber_filter.has_price_range:
+            self._price.add(user_id, subscriber_filter.min_price, subscriber_filter.max_price)
+        else:
+            self._price_any.add(user_id)
+
+        if subscriber_filter.domain_extensions:
+            for ext in subscriber_filter.domain_extensions:
+                self._extensions.setdefault(ext, set()).add(user_id)
+            self._extension_lengths = sorted({len(ext) for ext in self._extensions})
+        else:
+            self._extensions_any.add(user_id)
+
+        if subscriber_filter.max_letters:
+            self._letter_buckets.setdefault(subscriber_filter.max_letters, set()).add(user_id)
+            self._letter_keys = sorted(self._letter_buckets)
+        else:
+            self._letters_any.add(user_id)
+
+        seller = subscriber_filter.seller_address
+        if not seller:
+            self._sellers_any.add(user_id)
+        elif ADDRESS_PATTERN.fullmatch(seller):
+            self._sellers.setdefault(seller, set()).add(user_id)
+        else:
+            # Anything else is a substring match, checked only for its owner
+            self._seller_partial[user_id] = seller
+
+        if subscriber_filter.keyword:
+            self._keywords[user_id] = subscriber_filter.keyword
+
+    def clear_filter(self, user_id):
+        """Drop a subscriber's personal filter so they follow the default again."""
+        subscriber_filter = self.filters.pop(user_id, None)
+        if subscriber_filter is None:
+            return
+
+        self.default_users.add(user_id)
+        self._price.remove(user_id)
+        self._price_any.discard(user_id)
+        self._extensions_any.discard(user_id)
+        self._letters_any.discard(user_id)
+        self._sellers_any.discard(user_id)
+        self._seller_partial.pop(user_id, None)
+        self._keywords.pop(user_id, None)
+
+        for ext in subscriber_filter.domain_extensions:
+            self._discard_from(self._extensions, ext, user_id)
+        self._extension_lengths = sorted({len(ext) for ext in self._extensions})
+
+        if subscriber_filter.max_letters:
+            self._discard_from(self._letter_buckets, subscriber_filter.max_letters, user_id)
+            self._letter_keys = sorted(self._letter_buckets)
+
+        if subscriber_filter.seller_address:
+            self._discard_from(self._sellers, subscriber_filter.seller_address, user_id)
+
+    @staticmethod
+    def _discard_from(index, key, user_id):
+        users = index.get(key)
+        if users is not None:
+            users.discard(user_id)
+            if not users:
+                del index[key]
+
+    def match(self, record):
+        """Return the subscribers with a personal filter that matches the EventRecord."""
+        if not self.filters:
+            return set()
+
+        candidate_sets = []
+
+        price = record.price
+        if price is None or math.isnan(price):
+            # matches() never puts a missing or NaN price inside a range
+            candidate_sets.append(self._price_any)
+        else:
+            candidate_sets.append(self._price_any | self._price.stab(price))
+
+        domain_name = record.domain_name
+        if domain_name:
+            # Extension filters are suffixes, so look up one suffix per distinct length
+            by_extension = set(self._extensions_any)
+            for length in self._extension_lengths:
+                by_extension |= self._extensions.get(domain_name[-length:], set())
+            candidate_sets.append(by_extension)
+
+            # Buckets keyed by max letters, every bucket at or above the name length passes
+            by_length = set(self._letters_any)
+            for max_letters in self._letter_keys[bisect_left(self._letter_keys, record.name_length):]:
+                by_length |= self._letter_buckets[max_letters]
+            candidate_sets.append(by_length)
+
+        seller = record.seller_lower
+        if seller:
+            # Sellers come as CAIP-10 (eip155:<chain>:0x...), so look up every address the seller contains
+            by_seller = set(self._sellers_any)
+            if self._sellers:
+                for address in seller_addresses(seller):
+                    by_seller |= self._sellers.get(address, set())
+            by_seller.update(user_id for user_id, partial in self._seller_partial.items() if partial in seller)
+            candidate_sets.append(by_seller)
+
+        candidate_sets.sort(key=len)
+        matched = set(candidate_sets[0])
+        for candidates in candidate_sets[1:]:
+            matched &= candidates
+
+        # Keywords are plain substring checks, only run for the surviving candidates
+        if domain_name and self._keywords:
+            matched = {user_id for user_id in matched
+                       if user_id not in self._keywords or self._keywords[user_id] in domain_name}
+
+        return matched
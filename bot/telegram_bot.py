@@ -1,27 +1,94 @@
 import os
 import json
-import subprocess
 import sys
-import requests
-import threading
-import queue
+import time
+import hmac
+import signal
+from urllib.parse import urlencode
+import httpx
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import Application, CommandHandler, CallbackQueryHandler, ContextTypes
 import asyncio
+import logging
 from datetime import datetime
-from flask import Flask, request, jsonify
-from flask_cors import CORS
+from quart import Quart, request, jsonify
+from quart_cors import cors
+import http_client
+import metrics
+from alert_queue import REJECT, AlertQueue
+from broadcaster import Broadcaster
+from digest import DigestBuffer, DigestSettings
+from subscriptions import SubscriberFilter, SubscriptionIndex
+from events import EventRecord
+from fanout_workers import FANOUT_WORKERS, FanoutPool
+from event_handlers import EventDispatcher, EventHandler
+from field_resolver import FieldResolver, FieldSpec
+import json_stream
+from json_walker import walk_json, find_first, format_path, is_address, is_tx_hash
+from bot_logging import get_logger, setup_logging
+from subscriber_store import SubscriberStore
+from poll_state import PollState
+from resilience import STATE_VALUES, CircuitOpenError, Resilience
+from single_flight import SingleFlightCache
+from website_text import WebsiteText
+
+logger = get_logger(__name__)
 
 # Bot configuration
 BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN', 'YOUR_BOT_TOKEN_HERE')
 API_KEY = "v1.d25826e8ff3c9607022227c25f76cccafba3a13b0514977d02616ce1b98fa23c"
-URL = "https://api-testnet.doma.xyz/v1/poll?eventTypes=NAME_TOKEN_LISTED&limit=1"
+# Overridable to point the bot at a local stand-in, e.g. the load test harness
+DOMA_API_BASE = os.getenv('DOMA_API_BASE', 'https://api-testnet.doma.xyz').rstrip('/')
+TELEGRAM_API_BASE_URL = os.getenv('TELEGRAM_API_BASE_URL', 'https://api.telegram.org/bot')
+# Event types requested together in every poll, comma separated
+EVENT_TYPES = [event_type.strip() for event_type in os.getenv('DOMA_EVENT_TYPES', 'NAME_TOKEN_LISTED').split(',') if event_type.strip()]
+EVENT_TYPES_QUERY = urlencode([('eventTypes', event_type) for event_type in EVENT_TYPES])
+URL = f"{DOMA_API_BASE}/v1/poll?{EVENT_TYPES_QUERY}&limit=1"
 WEBSITE_URL = "http://localhost:5173"
 
-# Store user IDs for broadcasting
+# Field names that may hold the token address, on the event or its eventData
+TOKEN_ADDRESS_FIELDS = ['tokenAddress', 'token_address', 'address', 'contractAddress', 'contract_address', 'token', 'tokenId', 'token_id']
+
+# Background poller configuration
+POLLER_ENABLED = os.getenv('DOMA_POLLER_ENABLED', 'true').lower() == 'true'
+POLL_LIMIT = int(os.getenv('DOMA_POLL_LIMIT', '100'))
+POLL_MIN_INTERVAL = float(os.getenv('DOMA_POLL_MIN_INTERVAL', '1'))
+POLL_MAX_INTERVAL = float(os.getenv('DOMA_POLL_MAX_INTERVAL', '15'))
+POLL_URL = f"{DOMA_API_BASE}/v1/poll?{EVENT_TYPES_QUERY}&limit={POLL_LIMIT}"
+# Decode poll pages event by event while they download instead of all at once
+POLL_STREAMING = os.getenv('DOMA_POLL_STREAMING', 'false').lower() == 'true'
+# Seconds the on-demand lookups (Send Alert, /api/test-api-response) reuse a Doma response; 0 only coalesces concurrent calls
+DOMA_LOOKUP_CACHE_TTL = float(os.getenv('DOMA_LOOKUP_CACHE_TTL', '5'))
+# The timeout /api/test-api-response always had; Send Alert shares the same request
+DOMA_LOOKUP_TIMEOUT = 10
+TELEGRAM_MESSAGE_LIMIT = 4096
+
+# Webhook mode: set TELEGRAM_WEBHOOK_URL to the public base URL that forwards to this server
+WEBHOOK_URL = os.getenv('TELEGRAM_WEBHOOK_URL', '').rstrip('/')
+WEBHOOK_SECRET = os.getenv('TELEGRAM_WEBHOOK_SECRET', '')
+WEBHOOK_PATH = '/telegram/webhook'
+# Only the update types the handlers use
+ALLOWED_UPDATES = [Update.MESSAGE, Update.CALLBACK_QUERY]
+
+# Store user IDs for broadcasting, persisted by subscriber_store
 user_ids = set()
+subscriber_store = SubscriberStore()
+
+# Persisted poll cursor and recently processed event ids
+poll_state = PollState()
 
-# Advanced filter configuration
+# Retries, circuit breaker and hedging for every Doma API call
+doma_api = Resilience('doma')
+# Last text extracted from WEBSITE_URL, revalidated with conditional requests
+website_text = WebsiteText(WEBSITE_URL)
+
+# Shared by everyone pressing Send Alert at once; the poller always fetches fresh pages
+doma_lookups = SingleFlightCache('doma_lookup', DOMA_LOOKUP_CACHE_TTL, cacheable=lambda result: result['success'])
+
+# Per-subscriber filters; subscribers without one follow advanced_filter
+subscriptions = SubscriptionIndex()
+
+# Default advanced filter configuration
 advanced_filter = {
     'min_price': 0,
     'max_price': float('inf'),
@@ -31,19 +98,29 @@ advanced_filter = {
     'seller_address': '',
     'enabled': False
 }
+default_filter_predicate = lambda record: True
 
-# Flask app for API endpoints
-app = Flask(__name__)
-CORS(app)  # Enable CORS for all routes
+# Async API server, served on the bot's own event loop
+app = cors(Quart(__name__))  # Enable CORS for all routes
+API_HOST = '0.0.0.0'
+API_PORT = int(os.getenv('API_PORT', '5000'))
 bot_application = None
-message_queue = queue.Queue()
+broadcaster = None
+# Matched events buffered for subscribers in digest mode
+digests = None
+# Worker processes that deliver alerts when FANOUT_WORKERS > 0
+fanout_pool = None
+# Bounded alert queue drained by process_message_queue() on the bot's event loop
+alert_queue = None
+# Set in post_stop to shut the API server down
+api_shutdown = asyncio.Event()
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Send a message when the command /start is issued."""
     # Add user to the list for broadcasting
     user_id = update.effective_user.id
-    user_ids.add(user_id)
-    print(f"✅ User {user_id} added to user_ids. Total users: {len(user_ids)}")
+    add_subscriber(user_id)
+    logger.info("✅ User %s added to user_ids. Total users: %d", user_id, len(user_ids))
     
     keyboard = [
         [InlineKeyboardButton("🚨 Send Alert", callback_data='send_alert')],
@@ -57,7 +134,8 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         'Available commands:\n'
         '• Send Alert - Check API response\n'
         '• Get Website Text - Fetch text from localhost:5173\n'
-        '• Broadcast Test - Send test message to all users',
+        '• Broadcast Test - Send test message to all users\n'
+        '• /digest on|off - Get alerts batched into one message',
         reply_markup=reply_markup
     )
 
@@ -70,12 +148,11 @@ async def send_alert(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None
     await query.edit_message_text("🔄 Processing alert... Please wait...")
     
     try:
-        # Run the doma_curl.py script
-        result = await run_doma_api()
+        result = await lookup_doma_api()
         
         if result['success']:
             # Extract name and type from response
-            extracted_data = extract_name_and_type(result['response'])
+            extracted_data = extract_name_and_type(result['response'], collect_paths=False)
             
             message = "✅ Alert sent successfully!\n\n"
             message += f"📊 API Response:\n```json\n{json.dumps(result['response'], indent=2)}\n```\n\n"
@@ -114,17 +191,10 @@ async def get_website_text(update: Update, context: ContextTypes.DEFAULT_TYPE) -
     await query.edit_message_text("🔄 Fetching website content... Please wait...")
     
     try:
-        # Fetch content from localhost:5173
-        response = requests.get(WEBSITE_URL, timeout=10)
+        # Fetch content from localhost:5173, reusing the last text if the page hasn't changed
+        status_code, text_content = await website_text.fetch(timeout=10)
         
-        if response.status_code == 200:
-            # Extract text content (basic HTML parsing)
-            from bs4 import BeautifulSoup
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            # Get all text content
-            text_content = soup.get_text(separator='\n', strip=True)
-            
+        if text_content is not None:
             # Limit message length (Telegram has message limits)
             if len(text_content) > 3000:
                 text_content = text_content[:3000] + "\n\n... (truncated)"
@@ -134,9 +204,9 @@ async def get_website_text(update: Update, context: ContextTypes.DEFAULT_TYPE) -
             message += f"```\n{text_content}\n```"
             
         else:
-            message = f"❌ Error fetching website: HTTP {response.status_code}"
+            message = f"❌ Error fetching website: HTTP {status_code}"
             
-    except requests.exceptions.ConnectionError:
+    except httpx.ConnectError:
         message = f"❌ Could not connect to {WEBSITE_URL}\n\nMake sure the website is running on localhost:5173"
     except Exception as e:
         message = f"❌ Error: {str(e)}"
@@ -163,43 +233,77 @@ async def broadcast_test(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         await query.edit_message_text("❌ No users to broadcast to. Users need to start the bot first.")
         return
     
+    text = "🧪 Test message from Doma Bot!\n\nThis is a test broadcast to all users who started the bot."
+    keyboard = [
+        [InlineKeyboardButton("🔄 Try Again", callback_data='broadcast_test')],
+        [InlineKeyboardButton("🏠 Main Menu", callback_data='main_menu')]
+    ]
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    
+    if fanout_pool is not None:
+        # The workers own the bot's rate limit in fan-out mode, sending from here as well would exceed it
+        fanout_pool.publish(text, list(user_ids))
+        await query.edit_message_text(
+            f"📢 Broadcast queued for {len(user_ids)} users across {fanout_pool.workers} workers.",
+            reply_markup=reply_markup
+        )
+        return
+    
     # Show loading message
     await query.edit_message_text("🔄 Broadcasting test message... Please wait...")
     
-    success_count = 0
-    error_count = 0
+    result = await broadcaster.broadcast(
+        list(user_ids),  # Create a copy to avoid modification during iteration
+        text
+    )
     
-    for user_id in list(user_ids):  # Create a copy to avoid modification during iteration
-        try:
-            await context.bot.send_message(
-                chat_id=user_id,
-                text="🧪 Test message from Doma Bot!\n\nThis is a test broadcast to all users who started the bot."
-            )
-            success_count += 1
-        except Exception as e:
-            print(f"Error sending to user {user_id}: {e}")
-            error_count += 1
-            # Remove user from list if they blocked the bot
-            if "bot was blocked" in str(e).lower():
-                user_ids.discard(user_id)
+    # Remove users who blocked the bot
+    for user_id in result['blocked']:
+        remove_subscriber(user_id)
+    
+    success_count = result['sent']
+    error_count = result['failed'] + len(result['blocked'])
     
     message = f"📢 Broadcast completed!\n\n"
     message += f"✅ Successfully sent to: {success_count} users\n"
     message += f"❌ Failed to send to: {error_count} users\n"
-    message += f"👥 Total users: {len(user_ids)}"
-    
-    # Add button to try again
-    keyboard = [
-        [InlineKeyboardButton("🔄 Try Again", callback_data='broadcast_test')],
-        [InlineKeyboardButton("🏠 Main Menu", callback_data='main_menu')]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    message += f"👥 Total users: {len(user_ids)}\n"
+    message += f"⏱️ Completed in {result['elapsed']:.2f}s"
     
     await query.edit_message_text(
         message,
         reply_markup=reply_markup
     )
 
+async def digest_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Turn digest mode on or off: /digest on [seconds] [max events], /digest off."""
+    user_id = update.effective_user.id
+    args = context.args or []
+    
+    if user_id not in user_ids:
+        await update.message.reply_text('Send /start first to subscribe to alerts.')
+        return
+    
+    mode = args[0].lower() if args else ''
+    if mode == 'off':
+        disable_digest(user_id)
+        await update.message.reply_text('📬 Digest mode off, alerts will arrive one by one.')
+        return
+    
+    try:
+        if mode != 'on':
+            raise ValueError(mode)
+        settings = DigestSettings(*(float(arg) for arg in args[1:3]))
+    except ValueError:
+        await update.message.reply_text('Usage: /digest on [seconds] [max events] or /digest off')
+        return
+    
+    configure_digest_mode(user_id, settings)
+    await update.message.reply_text(
+        f'📬 Digest mode on: one message every {settings.window:g}s '
+        f'or every {settings.max_events} alerts, whichever comes first.'
+    )
+
 async def main_menu(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Return to main menu."""
     query = update.callback_query
@@ -221,21 +325,21 @@ async def main_menu(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         reply_markup=reply_markup
     )
 
-async def run_doma_api():
-    """Run the doma API call and return the result."""
+async def run_doma_api(url=URL, timeout=1, mode='buffered'):
+    """Run the doma API call and return the result; mode labels its timing in doma_request_seconds."""
+    started_at = time.perf_counter()
     try:
-        # Try with requests first (most reliable)
-        import requests
-        
         headers = {
             'Api-Key': API_KEY
         }
         
-        response = requests.get(URL, headers=headers, timeout=1)
+        # Non-blocking request over the shared keep-alive pool; polls are idempotent until acked, so safe to hedge
+        response = await doma_api.call(lambda: http_client.get(url, headers=headers, timeout=timeout), hedge=True)
         
         if response.status_code == 200:
             try:
-                json_data = response.json()
+                # orjson when installed; its decode error subclasses json's
+                json_data = json_stream.loads(response.content)
                 return {
                     'success': True,
                     'response': json_data
@@ -251,203 +355,303 @@ async def run_doma_api():
                 'error': f"HTTP {response.status_code}: {response.text}"
             }
             
-    except ImportError:
-        # Fallback to subprocess curl
+    except CircuitOpenError as e:
+        return {
+            'success': False,
+            'error': f"Doma API unavailable: {e}"
+        }
+    except Exception as e:
+        return {
+            'success': False,
+            'error': f"Request error: {str(e)}"
+        }
+    finally:
+        metrics.DOMA_REQUEST_SECONDS.observe(time.perf_counter() - started_at, mode=mode)
+
+async def lookup_doma_api():
+    """run_doma_api() for on-demand lookups: concurrent callers share one request and results stay fresh for a few seconds."""
+    return await doma_lookups.get(URL, lambda: run_doma_api(timeout=DOMA_LOOKUP_TIMEOUT, mode='lookup'))
+
+async def stream_doma_api(url, on_event, timeout=10):
+    """Stream a poll page, calling on_event for each event as soon as it is decoded."""
+    started_at = time.perf_counter()
+    try:
+        headers = {
+            'Api-Key': API_KEY
+        }
+        
+        # Retried only until the headers arrive, before any event was handed out; not hedged
+        response = await doma_api.call(lambda: http_client.open_stream('GET', url, headers=headers, timeout=timeout))
         try:
-            cmd = [
-                'curl',
-                URL,
-                '--header', f'Api-Key: {API_KEY}'
-            ]
-            
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
-            
-            if result.returncode == 0:
-                try:
-                    json_data = json.loads(result.stdout)
-                    return {
-                        'success': True,
-                        'response': json_data
-                    }
-                except json.JSONDecodeError:
-                    return {
-                        'success': True,
-                        'response': {'raw_response': result.stdout}
-                    }
-            else:
+            if response.status_code != 200:
+                await response.aread()
                 return {
                     'success': False,
-                    'error': f"Curl failed: {result.stderr}"
+                    'error': f"HTTP {response.status_code}: {response.text}"
                 }
-        except Exception as e:
+            
+            decoder = json_stream.EventStreamDecoder()
+            async for chunk in response.aiter_bytes():
+                for event in decoder.feed(chunk):
+                    await on_event(event)
+            
+            # The rest of the page (lastId, hasMoreEvents) with an empty events list
+            envelope = decoder.finish()
             return {
-                'success': False,
-                'error': f"Subprocess error: {str(e)}"
+                'success': True,
+                'response': envelope,
+                'events_count': decoder.count
             }
+        finally:
+            await response.aclose()
+            
+    except CircuitOpenError as e:
+        return {
+            'success': False,
+            'error': f"Doma API unavailable: {e}"
+        }
     except Exception as e:
         return {
             'success': False,
             'error': f"Request error: {str(e)}"
         }
+    finally:
+        # Includes the per-event work done while the page streams in
+        metrics.DOMA_REQUEST_SECONDS.observe(time.perf_counter() - started_at, mode='streaming')
 
-def extract_name_and_type(response_data):
-    """Extract name and type from the API response."""
-    extracted = []
+async def ack_doma_events(last_id):
+    """Acknowledge events up to last_id so the next poll returns newer ones."""
+    try:
+        headers = {
+            'Api-Key': API_KEY
+        }
+        
+        # Acking the same lastId twice is harmless, so failed acks are retried
+        response = await doma_api.call(lambda: http_client.post(f"{DOMA_API_BASE}/v1/poll/ack/{last_id}", headers=headers, timeout=10))
+        
+        if response.status_code in (200, 204):
+            return True
+        
+        logger.warning("❌ Ack for lastId %s failed: HTTP %s", last_id, response.status_code)
+        return False
+        
+    except Exception as e:
+        logger.warning("❌ Ack for lastId %s failed: %s", last_id, e)
+        return False
+
+async def queue_poll_page(response_data):
+    """Queue an alert for every new event in a poll page that passes the filters."""
+    # Events already processed (replayed page, second browser tab) are dropped here
+    new_events, new_ids = poll_state.claim_new(get_response_events(response_data))
+    alerts = build_alerts(dict(response_data, events=new_events))
     
-    def search_recursive(data, path=""):
-        if isinstance(data, dict):
-            for key, value in data.items():
-                current_path = f"{path}.{key}" if path else key
-                
-                # Look for name and type fields
-                if key.lower() == 'name' and isinstance(value, str):
-                    extracted.append({
-                        'name': value,
-                        'type': data.get('type', 'Unknown'),
-                        'path': current_path
-                    })
-                elif key.lower() == 'type' and isinstance(value, str):
-                    # Look for corresponding name field
-                    name_value = data.get('name', 'Unknown')
-                    extracted.append({
-                        'name': name_value,
-                        'type': value,
-                        'path': current_path
-                    })
-                
-                # Recursively search nested objects
-                if isinstance(value, (dict, list)):
-                    search_recursive(value, current_path)
-                    
-        elif isinstance(data, list):
-            for i, item in enumerate(data):
-                search_recursive(item, f"{path}[{i}]")
-    
-    search_recursive(response_data)
-    return extracted
-
-def find_txhash_deep(obj, path=""):
-    """Recursively search for transaction hash in any field that looks like a hash."""
-    if isinstance(obj, dict):
-        for key, value in obj.items():
-            current_path = f"{path}.{key}" if path else key
-            
-            # Check if this field looks like a transaction hash
-            if isinstance(value, str) and len(value) == 66 and value.startswith('0x'):
-                print(f"🔍 Found potential txhash at {current_path}: {value}")
-                return value
-            
-            # Recursively search in nested objects
-            result = find_txhash_deep(value, current_path)
-            if result:
-                return result
-                
-    elif isinstance(obj, list):
-        for i, item in enumerate(obj):
-            result = find_txhash_deep(item, f"{path}[{i}]")
-            if result:
-                return result
+    # Waits while the queue is full, so a slow sender slows the poller down
+    for message, recipients, record in alerts:
+        await alert_queue.put(message, recipients, record)
     
-    return None
+    return len(alerts), new_ids
 
-def find_token_address_deep(obj, path=""):
-    """Recursively search for token address in any field that looks like an address."""
-    if isinstance(obj, dict):
-        for key, value in obj.items():
-            current_path = f"{path}.{key}" if path else key
-            
-            # Check if this field looks like an Ethereum address (42 chars, starts with 0x)
-            if isinstance(value, str) and len(value) == 42 and value.startswith('0x'):
-                print(f"🔍 Found potential token address at {current_path}: {value}")
-                return value
+async def poll_page_streaming():
+    """Poll one page, queueing each new event's alert while the rest is still downloading."""
+    page = {'queued': 0, 'new_ids': []}
+    
+    async def on_event(event):
+        new_events, new_ids = poll_state.claim_new([event])
+        page['new_ids'].extend(new_ids)
+        for new_event in new_events:
+            alert = build_alert(new_event)
+            if alert is not None:
+                await alert_queue.put(*alert)
+                page['queued'] += 1
+    
+    result = await stream_doma_api(POLL_URL, on_event, timeout=10)
+    return result, result.get('events_count', 0), page['queued'], page['new_ids']
+
+async def poll_page_buffered():
+    """Poll one page, decode it whole and queue alerts for its new events."""
+    result = await run_doma_api(POLL_URL, timeout=10)
+    events = get_response_events(result['response']) if result['success'] else []
+    if not events:
+        return result, 0, 0, []
+    
+    queued, new_ids = await queue_poll_page(result['response'])
+    return result, len(events), queued, new_ids
+
+def next_poll_interval(current_interval, events_count, has_more=False):
+    """Poll again as soon as allowed while events keep arriving, back off only on empty pages."""
+    if events_count or has_more:
+        # Even a sparse stream should be picked up quickly, a slow poll only adds latency
+        return POLL_MIN_INTERVAL
+    
+    # Quiet period, back off gradually towards the max interval
+    return min(max(current_interval, POLL_MIN_INTERVAL) * 2, POLL_MAX_INTERVAL)
+
+async def poll_doma_events():
+    """Continuously pull event pages from Doma, queue alerts and ack the page."""
+    interval = POLL_MIN_INTERVAL
+    logger.info("🔄 Doma poller started (types=%s, limit=%d, interval %s-%ss)", ','.join(EVENT_TYPES), POLL_LIMIT, POLL_MIN_INTERVAL, POLL_MAX_INTERVAL)
+    
+    # A page queued before the last shutdown but never acked: ack it now so polling resumes after it
+    if poll_state.last_id is not None and not poll_state.acked:
+        logger.info("📍 Resuming: acking lastId %s from the previous run", poll_state.last_id)
+        if await ack_doma_events(poll_state.last_id):
+            await asyncio.to_thread(poll_state.save, poll_state.last_id, True)
+    
+    while True:
+        try:
+            if POLL_STREAMING:
+                result, events_count, queued, new_ids = await poll_page_streaming()
+            else:
+                result, events_count, queued, new_ids = await poll_page_buffered()
             
-            # Recursively search in nested objects
-            result = find_token_address_deep(value, current_path)
-            if result:
-                return result
+            metrics.DOMA_POLLS.inc(result='success' if result['success'] else 'error')
+            if not result['success']:
+                logger.warning("❌ Doma poll failed: %s", result['error'])
+                interval = POLL_MAX_INTERVAL
+                if new_ids:
+                    # A stream cut off mid-page still delivered these, remember them so the retry skips them
+                    await asyncio.to_thread(poll_state.save, None, False, new_ids)
+            else:
+                response_data = result['response']
                 
-    elif isinstance(obj, list):
-        for i, item in enumerate(obj):
-            result = find_token_address_deep(item, f"{path}[{i}]")
-            if result:
-                return result
-    
+                if events_count:
+                    logger.info("📥 Polled %d events (%d new), queued %d alerts", events_count, len(new_ids), queued)
+                    
+                    # Persist the page before acking, so a crash in between replays it and dedup drops the repeats
+                    last_id = response_data.get('lastId') if isinstance(response_data, dict) else None
+                    await asyncio.to_thread(poll_state.save, last_id, False, new_ids)
+                    
+                    # Only ack once the whole page has been handed to the broadcaster
+                    if last_id is not None and await ack_doma_events(last_id):
+                        await asyncio.to_thread(poll_state.save, last_id, True)
+                
+                has_more = isinstance(response_data, dict) and bool(response_data.get('hasMoreEvents'))
+                interval = next_poll_interval(interval, events_count, has_more)
+                
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.exception("Error in Doma poller: %s", e)
+            interval = POLL_MAX_INTERVAL
+        
+        await asyncio.sleep(interval)
+
+def extract_name_and_type(response_data, collect_paths=False):
+    """Extract name and type from the API response; paths are only built for debug output."""
+    return walk_json(response_data, collect_paths=collect_paths).names
+
+def find_txhash_deep(obj):
+    """Search for the first transaction hash in any field that looks like a hash."""
+    found = find_first(obj, is_tx_hash)
+    if found:
+        logger.debug("🔍 Found potential txhash at %s: %s", format_path(found[0]), found[1])
+        return found[1]
     return None
 
-def find_all_hashes(obj, path=""):
+def find_token_address_deep(obj):
+    """Search for the first token address in any field that looks like an address."""
+    found = find_token_address_path(obj)
+    return found[1] if found else None
+
+def find_token_address_path(obj):
+    """Find the first address-like string and the path to it."""
+    found = find_first(obj, is_address)
+    if found:
+        logger.debug("🔍 Found potential token address at %s: %s", format_path(found[0]), found[1])
+    return found
+
+def find_all_hashes(obj):
     """Find all potential transaction hashes in the response for debugging."""
-    hashes = []
-    if isinstance(obj, dict):
-        for key, value in obj.items():
-            current_path = f"{path}.{key}" if path else key
-            
-            # Check if this field looks like a transaction hash
-            if isinstance(value, str) and len(value) == 66 and value.startswith('0x'):
-                hashes.append({
-                    'path': current_path,
-                    'value': value,
-                    'field_name': key
-                })
-            
-            # Recursively search in nested objects
-            hashes.extend(find_all_hashes(value, current_path))
-                
-    elif isinstance(obj, list):
-        for i, item in enumerate(obj):
-            hashes.extend(find_all_hashes(item, f"{path}[{i}]"))
-    
-    return hashes
+    return walk_json(obj, collect_paths=True).hashes
 
-def find_all_addresses(obj, path=""):
+def find_all_addresses(obj):
     """Find all potential Ethereum addresses in the response for debugging."""
-    addresses = []
-    if isinstance(obj, dict):
-        for key, value in obj.items():
-            current_path = f"{path}.{key}" if path else key
-            
-            # Check if this field looks like an Ethereum address (42 chars, starts with 0x)
-            if isinstance(value, str) and len(value) == 42 and value.startswith('0x'):
-                addresses.append({
-                    'path': current_path,
-                    'value': value,
-                    'field_name': key
-                })
-            
-            # Recursively search in nested objects
-            addresses.extend(find_all_addresses(value, current_path))
-                
-    elif isinstance(obj, list):
-        for i, item in enumerate(obj):
-            addresses.extend(find_all_addresses(item, f"{path}[{i}]"))
+    return walk_json(obj, collect_paths=True).addresses
+
+def create_digest_message(records):
+    """Combine several events into one digest message, each entry rendered by its event type's handler."""
+    header = f"📬 Doma Digest: {len(records)} new event{'s' if len(records) != 1 else ''}\n"
+    sections = []
+    length = len(header)
     
-    return addresses
+    for index, record in enumerate(records):
+        section = event_handlers.digest(record)
+        
+        # Stay inside Telegram's message size limit
+        if length + len(section) > TELEGRAM_MESSAGE_LIMIT - 40:
+            sections.append(f"\n…and {len(records) - index} more")
+            break
+        sections.append(section)
+        length += len(section)
+    
+    return header + ''.join(sections)
+
+def format_eth_price(price):
+    """Render a price in ETH for alert messages."""
+    if price and price > 0:
+        return f"{price:.6f} ETH"
+    return "Price not available"
+
+def format_token_link(token_address):
+    """Render the explorer link line for a token address."""
+    if token_address:
+        return f"🔗 Token Address: https://explorer-testnet.doma.xyz/address/{token_address}\n"
+    return f"🔗 Token Address: Not available\n"
+
+def format_digest_entry(record, label, with_price=True):
+    """Render one digest entry from the same fields as the single alert."""
+    entry = f"\n📝 {record.name or 'Unknown'} ({label})\n"
+    if with_price:
+        entry += f"💰 {format_eth_price(record.price)}\n"
+    if record.token_address:
+        entry += f"🔗 https://explorer-testnet.doma.xyz/address/{record.token_address}\n"
+    return entry
 
-def create_enhanced_message(extracted_data, response_data):
-    """Create an enhanced message with properly formatted data and token address link."""
+def create_event_digest(record):
+    """Digest entry for an event type without its own handler."""
+    return format_digest_entry(record, record.event_type or 'Unknown')
+
+def create_listing_digest(record):
+    """Digest entry for a listed name token."""
+    return format_digest_entry(record, 'listed')
+
+def create_purchase_digest(record):
+    """Digest entry for a name token that was bought."""
+    return format_digest_entry(record, 'sold')
+
+def create_tokenization_digest(record):
+    """Digest entry for a tokenization request, without a price like its single alert."""
+    return format_digest_entry(record, 'tokenization requested', with_price=False)
+
+def create_purchase_message(record, last_id='Unknown'):
+    """Create the alert for a name token that was bought."""
+    message = f"💸 Doma Name Sold:\n\n"
+    message += f"📝 Name: {record.name or 'Unknown'}\n"
+    message += f"💰 Price: {format_eth_price(record.price)}\n"
+    message += f"📅 Created: {record.created_at or 'Unknown'}\n"
+    message += f"🆔 LastId: {last_id}\n"
+    return message + format_token_link(record.token_address)
+
+def create_tokenization_message(record, last_id='Unknown'):
+    """Create the alert for a name whose tokenization was requested."""
+    message = f"🪙 Doma Tokenization Requested:\n\n"
+    message += f"📝 Name: {record.name or 'Unknown'}\n"
+    message += f"📅 Created: {record.created_at or 'Unknown'}\n"
+    message += f"🆔 LastId: {last_id}\n"
+    return message
+
+def create_enhanced_message(record, last_id='Unknown'):
+    """Create an enhanced message for one event with properly formatted data and token address link."""
     try:
         # Get basic info
-        name = extracted_data.get('name', 'Unknown')
-        price = extracted_data.get('price', 0)
-        token_address = extracted_data.get('token_address', None)
-        
-        # Get additional info from response_data
-        event_type = 'NAME_TOKEN_LISTED'
-        created_at = 'Unknown'
-        last_id = 'Unknown'
-        
-        if 'events' in response_data and len(response_data['events']) > 0:
-            event = response_data['events'][0]
-            event_type = event.get('type', 'NAME_TOKEN_LISTED')
-            if 'eventData' in event and 'eventCreatedAt' in event['eventData']:
-                created_at = event['eventData']['eventCreatedAt']
-            if 'lastId' in response_data:
-                last_id = response_data['lastId']
-        
-        # Format price (already converted to ETH in extract_data_from_response)
-        if price and price > 0:
-            formatted_price = f"{price:.6f} ETH"
-        else:
-            formatted_price = "Price not available"
+        name = record.name or 'Unknown'
+        price = record.price
+        token_address = record.token_address
+        event_type = record.event_type or 'NAME_TOKEN_LISTED'
+        created_at = record.created_at or 'Unknown'
+        
+        # Format price (already converted to ETH in extract_event_data)
+        formatted_price = format_eth_price(price)
         
         # Create message
         message = f"🌐 Doma API Data:\n\n"
@@ -458,180 +662,183 @@ def create_enhanced_message(extracted_data, response_data):
         message += f"🆔 LastId: {last_id}\n"
         
         # Add token address link if available
-        if token_address:
-            message += f"🔗 Token Address: https://explorer-testnet.doma.xyz/address/{token_address}\n"
-        else:
-            message += f"🔗 Token Address: Not available\n"
+        message += format_token_link(token_address)
         
         return message
         
     except Exception as e:
-        print(f"❌ Error creating enhanced message: {e}")
+        logger.error("❌ Error creating enhanced message: %s", e)
         # Fallback to basic message
-        return f"🌐 Doma API Data:\n\n{extracted_data.get('name', 'Unknown')} - Data received but formatting failed"
+        return f"🌐 Doma API Data:\n\n{record.name or 'Unknown'} - Data received but formatting failed"
 
-def extract_data_from_response(response_data):
-    """Extract all relevant data from the API response."""
+def parse_wei_price(value):
+    """Convert a wei amount (number or numeric string) to ETH, or None."""
+    if isinstance(value, (int, float)):
+        return float(value) / 1e18
+    if isinstance(value, str):
+        try:
+            return float(value) / 1e18
+        except ValueError:
+            return None
+    return None
+
+def clean_string(value):
+    """Return a stripped non-empty string, or None."""
+    if isinstance(value, str) and value.strip():
+        return value.strip()
+    return None
+
+def plain_string(value):
+    """Return the value if it is a string, or None."""
+    return value if isinstance(value, str) else None
+
+# Where each field may live, in priority order; the resolver learns the winning path per event type
+field_resolver = FieldResolver({
+    'token_address': FieldSpec(
+        [(field,) for field in TOKEN_ADDRESS_FIELDS] + [('eventData', field) for field in TOKEN_ADDRESS_FIELDS],
+        clean_string,
+        deep_scan=find_token_address_path
+    ),
+    'price': FieldSpec(
+        [('price',), ('eventData', 'payment', 'price')],
+        parse_wei_price
+    ),
+    'seller_address': FieldSpec(
+        [('seller',), ('sellerAddress',), ('eventData', 'seller'), ('eventData', 'sellerAddress')],
+        plain_string
+    ),
+})
+
+def extract_event_data(event):
+    """Extract all relevant data from a single poll event into an EventRecord."""
+    if not isinstance(event, dict):
+        return EventRecord(event)
+    
     try:
-        extracted_data = {
-            'price': None,
-            'name': None,
-            'seller_address': None,
-            'token_address': None
-        }
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("🔍 Extracting data from event: %s", list(event.keys()))
         
-        # Check if response has events array
-        if 'events' in response_data and isinstance(response_data['events'], list) and len(response_data['events']) > 0:
-            event = response_data['events'][0]
-            
-            print(f"🔍 Extracting data from event: {list(event.keys())}")
-            
-            # Extract name (domain name)
-            if 'name' in event and isinstance(event['name'], str):
-                extracted_data['name'] = event['name']
-            
-            # Comprehensive token address extraction - check multiple possible field names
-            token_address_fields = ['tokenAddress', 'token_address', 'address', 'contractAddress', 'contract_address', 'token', 'tokenId', 'token_id']
-            for field in token_address_fields:
-                if field in event and isinstance(event[field], str) and event[field].strip():
-                    extracted_data['token_address'] = event[field].strip()
-                    print(f"✅ Found token address in field '{field}': {extracted_data['token_address']}")
-                    break
-            
-            # Extract price from eventData.payment.price
-            if 'eventData' in event and isinstance(event['eventData'], dict):
-                if 'payment' in event['eventData'] and isinstance(event['eventData']['payment'], dict):
-                    if 'price' in event['eventData']['payment']:
-                        price = event['eventData']['payment']['price']
-                        if isinstance(price, (int, float)):
-                            # Convert from wei to ETH (divide by 10^18)
-                            extracted_data['price'] = float(price) / 1e18
-                        elif isinstance(price, str):
-                            try:
-                                # Convert from wei to ETH (divide by 10^18)
-                                extracted_data['price'] = float(price) / 1e18
-                            except ValueError:
-                                pass
-                
-                # Extract seller address
-                if 'seller' in event['eventData'] and isinstance(event['eventData']['seller'], str):
-                    extracted_data['seller_address'] = event['eventData']['seller']
-                elif 'sellerAddress' in event['eventData'] and isinstance(event['eventData']['sellerAddress'], str):
-                    extracted_data['seller_address'] = event['eventData']['sellerAddress']
-                
-                # Extract token address from eventData - comprehensive search
-                if not extracted_data['token_address']:  # Only if not found in main event
-                    print(f"🔍 Searching eventData for token address: {list(event['eventData'].keys())}")
-                    for field in token_address_fields:
-                        if field in event['eventData'] and isinstance(event['eventData'][field], str) and event['eventData'][field].strip():
-                            extracted_data['token_address'] = event['eventData'][field].strip()
-                            print(f"✅ Found token address in eventData['{field}']: {extracted_data['token_address']}")
-                            break
-            
-            # Fallback: look for direct fields in event
-            if 'price' in event and isinstance(event['price'], (int, float)):
-                # Convert from wei to ETH (divide by 10^18)
-                extracted_data['price'] = float(event['price']) / 1e18
-            elif 'price' in event and isinstance(event['price'], str):
-                try:
-                    # Convert from wei to ETH (divide by 10^18)
-                    extracted_data['price'] = float(event['price']) / 1e18
-                except ValueError:
-                    pass
-            
-            if 'seller' in event and isinstance(event['seller'], str):
-                extracted_data['seller_address'] = event['seller']
-            elif 'sellerAddress' in event and isinstance(event['sellerAddress'], str):
-                extracted_data['seller_address'] = event['sellerAddress']
-            
-            # Deep search for token address if still not found
-            if not extracted_data['token_address']:
-                print("🔍 Performing deep search for token address...")
-                deep_token_address = find_token_address_deep(event)
-                if deep_token_address:
-                    extracted_data['token_address'] = deep_token_address
-                    print(f"✅ Found token address via deep search: {deep_token_address}")
-                else:
-                    print("❌ No token address found in any location")
-        
-        return extracted_data
+        event_type = event.get('type')
+        event_data = event.get('eventData') if isinstance(event.get('eventData'), dict) else {}
+        
+        # Token address, price and seller come from the path learned for this event type
+        token_address = field_resolver.resolve(event, event_type, 'token_address')
+        if not token_address:
+            logger.debug("❌ No token address found in any location")
+        
+        return EventRecord(
+            event,
+            event_type=event_type,
+            event_id=event.get('id'),
+            created_at=event_data.get('eventCreatedAt'),
+            name=event['name'] if isinstance(event.get('name'), str) else None,
+            price=field_resolver.resolve(event, event_type, 'price'),
+            seller_address=field_resolver.resolve(event, event_type, 'seller_address'),
+            token_address=token_address
+        )
         
     except Exception as e:
-        print(f"Error extracting data: {e}")
-        return {'price': None, 'name': None, 'seller_address': None, 'token_address': None}
-
-def should_send_message(response_data):
-    """Check if the message should be sent based on advanced filters."""
-    if not advanced_filter['enabled']:
-        print("🔍 Filter not enabled, sending message")
-        return True
-    
-    extracted_data = extract_data_from_response(response_data)
-    print(f"🔍 Extracted data: {extracted_data}")
-    print(f"🔍 Active filters: {advanced_filter}")
-    
-    # Check price filter
-    if advanced_filter['min_price'] > 0 or advanced_filter['max_price'] < float('inf'):
-        if extracted_data['price'] is None:
-            print("🚫 No price found in response, filtering out message")
-            return False
-        
-        price_in_range = advanced_filter['min_price'] <= extracted_data['price'] <= advanced_filter['max_price']
-        print(f"🔍 Price {extracted_data['price']} in range {advanced_filter['min_price']}-{advanced_filter['max_price']}: {price_in_range}")
-        if not price_in_range:
-            return False
-    
-    # Check domain name filters
-    if extracted_data['name']:
-        domain_name = extracted_data['name'].lower()
-        
-        # Check maximum letters
-        if advanced_filter['max_letters'] and len(domain_name) > advanced_filter['max_letters']:
-            print(f"🚫 Domain '{domain_name}' has {len(domain_name)} letters, max allowed: {advanced_filter['max_letters']}")
-            return False
-        
-        # Check domain extensions
-        if advanced_filter['domain_extensions']:
-            # Normalize domain name - remove any leading/trailing whitespace and convert to lowercase
-            clean_domain = domain_name.strip().lower()
-            
-            # Check if domain ends with any of the allowed extensions
-            domain_has_extension = any(clean_domain.endswith(ext.lower()) for ext in advanced_filter['domain_extensions'])
-            
-            print(f"🔍 Domain filtering:")
-            print(f"   Raw domain: '{domain_name}'")
-            print(f"   Clean domain: '{clean_domain}'")
-            print(f"   Allowed extensions: {advanced_filter['domain_extensions']}")
-            print(f"   Domain has allowed extension: {domain_has_extension}")
-            
-            if not domain_has_extension:
-                print(f"🚫 Domain '{clean_domain}' does not end with any allowed extension")
-                return False
-        
-        # Check keyword filter
-        if advanced_filter['keyword']:
-            keyword = advanced_filter['keyword'].lower()
-            domain_contains_keyword = keyword in domain_name
-            print(f"🔍 Domain '{domain_name}' contains keyword '{keyword}': {domain_contains_keyword}")
-            if not domain_contains_keyword:
-                return False
-    
-    # Check seller address filter
-    if advanced_filter['seller_address'] and extracted_data['seller_address']:
-        seller_match = advanced_filter['seller_address'].lower() in extracted_data['seller_address'].lower()
-        print(f"🔍 Seller address '{extracted_data['seller_address']}' matches filter '{advanced_filter['seller_address']}': {seller_match}")
-        if not seller_match:
-            return False
-    
-    print("✅ Message passed all filters")
-    return True
-
-# Flask API endpoints
+        logger.error("Error extracting data: %s", e)
+        return EventRecord(event)
+
+# Extractor and renderer per event type, looked up by event['type']; unknown types use the listing format
+event_handlers = EventDispatcher(EventHandler(extract_event_data, create_enhanced_message, create_event_digest))
+event_handlers.register('NAME_TOKEN_LISTED', extract_event_data, create_enhanced_message, create_listing_digest)
+event_handlers.register('NAME_TOKEN_PURCHASED', extract_event_data, create_purchase_message, create_purchase_digest)
+event_handlers.register('NAME_TOKENIZATION_REQUESTED', extract_event_data, create_tokenization_message, create_tokenization_digest)
+
+def get_response_events(response_data):
+    """Return the events array of a poll response, or an empty list."""
+    if isinstance(response_data, dict) and isinstance(response_data.get('events'), list):
+        return response_data['events']
+    return []
+
+def extract_data_from_response(response_data):
+    """Extract an EventRecord for every event in the API response."""
+    return [event_handlers.extract(event) for event in get_response_events(response_data)]
+
+def compile_default_filter(filter_config):
+    """Compile the default advanced filter into a predicate over EventRecords."""
+    if not filter_config['enabled']:
+        return lambda record: True
+    
+    return SubscriberFilter(
+        min_price=filter_config['min_price'],
+        max_price=filter_config['max_price'],
+        max_letters=filter_config['max_letters'],
+        domain_extensions=filter_config['domain_extensions'],
+        keyword=filter_config['keyword'],
+        seller_address=filter_config['seller_address']
+    ).matches
+
+def should_send_message(record):
+    """Check if an event passes the default advanced filters."""
+    return default_filter_predicate(record)
+
+def get_alert_recipients(record):
+    """Find every subscriber whose filter matches an event."""
+    recipients = subscriptions.match(record)
+    
+    # Subscribers without a personal filter share the default one, checked once
+    if subscriptions.default_users and should_send_message(record):
+        recipients |= subscriptions.default_users
+    
+    return recipients
+
+def build_alerts(response_data):
+    """Extract, filter and render every event of a poll page in a single pass."""
+    last_id = response_data.get('lastId', 'Unknown') if isinstance(response_data, dict) else 'Unknown'
+    alerts = []
+    
+    for event in get_response_events(response_data):
+        alert = build_alert(event, last_id)
+        if alert is not None:
+            alerts.append(alert)
+    
+    return alerts
+
+def build_alert(event, last_id=None):
+    """Extract, filter and render one event; returns (message, recipients, record) or None."""
+    handler = event_handlers.handler_for(event)
+    started_at = time.perf_counter()
+    record = handler.extract(event)
+    extracted_at = time.perf_counter()
+    recipients = get_alert_recipients(record)
+    metrics.EXTRACT_SECONDS.observe(extracted_at - started_at)
+    metrics.FILTER_SECONDS.observe(time.perf_counter() - extracted_at)
+    
+    if not recipients:
+        metrics.EVENTS.inc(result='filtered')
+        return None
+    metrics.EVENTS.inc(result='matched')
+    
+    # A streamed page only reveals its lastId after the events, so fall back to the event's own id
+    if last_id is None:
+        last_id = record.event_id if record.event_id is not None else 'Unknown'
+    return handler.render(record, last_id), recipients, record
+
+# API endpoints
 @app.route('/api/configure-filter', methods=['POST'])
-def configure_filter():
+async def configure_filter():
     """API endpoint to configure advanced filters."""
     try:
-        data = request.get_json()
+        data = await request.get_json()
+        user_id = data.get('userId')
+        
+        # A userId configures that subscriber's own filter instead of the default one
+        if user_id is not None:
+            user_id = int(user_id)
+            if user_id not in user_ids:
+                return jsonify({'error': f'User {user_id} has not started the bot'}), 404
+            
+            subscriber_filter = SubscriberFilter.from_config(data)
+            set_subscriber_filter(user_id, subscriber_filter)
+            logger.info("✅ Filter configured for user %s: %s", user_id, subscriber_filter.to_dict())
+            return jsonify({
+                'success': True,
+                'message': f'Filters configured for user {user_id}'
+            })
+        
         min_price = data.get('minPrice', 0)
         max_price = data.get('maxPrice', float('inf'))
         max_letters = data.get('maxLetters')
@@ -639,15 +846,12 @@ def configure_filter():
         keyword = data.get('keyword', '')
         seller_address = data.get('sellerAddress', '')
         
-        print(f"🔧 Received advanced filter configuration:")
-        print(f"   Price: {min_price} - {max_price}")
-        print(f"   Max letters: {max_letters}")
-        print(f"   Extensions: {domain_extensions}")
-        print(f"   Keyword: {keyword}")
-        print(f"   Seller: {seller_address}")
+        logger.info(
+            "🔧 Received advanced filter configuration: price %s - %s, max letters %s, extensions %s, keyword %r, seller %r",
+            min_price, max_price, max_letters, domain_extensions, keyword, seller_address
+        )
         
-        global advanced_filter
-        advanced_filter = {
+        filter_config = {
             'min_price': min_price,
             'max_price': max_price,
             'max_letters': max_letters,
@@ -656,131 +860,193 @@ def configure_filter():
             'seller_address': seller_address,
             'enabled': True
         }
+        # Compiled once here instead of re-reading the config for every event; an invalid
+        # config raises before either global changes, so the old filter stays in force
+        predicate = compile_default_filter(filter_config)
+        
+        global advanced_filter, default_filter_predicate
+        advanced_filter, default_filter_predicate = filter_config, predicate
         
-        print(f"✅ Advanced filters configured")
-        print(f"🔧 Current advanced_filter state: {advanced_filter}")
+        logger.info("✅ Advanced filters configured")
         return jsonify({
             'success': True,
             'message': 'Advanced filters configured successfully'
         })
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.exception("❌ Error in configure_filter: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/configure-digest', methods=['POST'])
+async def configure_digest():
+    """API endpoint to turn digest mode on or off for a subscriber."""
+    try:
+        data = await request.get_json()
+        user_id = int(data['userId'])
+        if user_id not in user_ids:
+            return jsonify({'error': f'User {user_id} has not started the bot'}), 404
+        if not bot_application:
+            return jsonify({'error': 'Bot not initialized'}), 500
+        
+        if data.get('enabled', True):
+            settings = DigestSettings.from_config(data)
+            configure_digest_mode(user_id, settings)
+            return jsonify({
+                'success': True,
+                'message': f'Digest mode on for user {user_id}',
+                'digest': settings.to_dict()
+            })
+        
+        disable_digest(user_id)
+        return jsonify({
+            'success': True,
+            'message': f'Digest mode off for user {user_id}'
+        })
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
-        print(f"❌ Error in configure_filter: {e}")
+        logger.exception("❌ Error in configure_digest: %s", e)
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/trigger-telegram', methods=['POST'])
-def trigger_telegram():
+async def trigger_telegram():
     """API endpoint to trigger telegram broadcast from website."""
     try:
-        data = request.get_json()
+        data = await request.get_json()
         message = data.get('message', 'test')
         response_data = data.get('responseData', None)
         
-        print(f"🔍 Debug: Received request with message: {message}")
-        print(f"🔍 Debug: user_ids count: {len(user_ids)}")
-        print(f"🔍 Debug: bot_application: {bot_application is not None}")
+        logger.debug("🔍 Received trigger request with message: %s (users: %d, bot ready: %s)",
+                     message, len(user_ids), bot_application is not None)
         
         if not user_ids:
-            print("❌ No users in user_ids set")
+            logger.warning("❌ No users in user_ids set")
             return jsonify({'error': 'No users to send message to. Users need to start the bot first with /start command.'}), 400
         
-        if not bot_application:
-            print("❌ Bot application not initialized")
+        if not bot_application or alert_queue is None:
+            logger.warning("❌ Bot application not initialized")
             return jsonify({'error': 'Bot not initialized'}), 500
         
-        # Check if message should be sent based on price filter
+        # Build one alert per new event that matches at least one subscriber, without claiming the events yet
+        events = get_response_events(response_data) if response_data else []
+        new_events = poll_state.unseen(events)
+        # A page without events is answered as filtered out below, only a page of seen events is a duplicate
+        if events and not new_events:
+            logger.debug("🔁 All events were already processed")
+            return jsonify({
+                'success': True,
+                'message': 'Events already processed',
+                'duplicate': True
+            })
+        alerts = build_alerts(dict(response_data, events=new_events)) if response_data else []
+        
+        # Only the alerts that will actually be queued count; a page larger than the whole queue is
+        # accepted once it is empty and waits for room below, instead of being rejected forever
+        needed = min(len(alerts) if response_data else 1, alert_queue.maxsize)
+        if alert_queue.policy == REJECT and alert_queue.free() < needed:
+            alert_queue.rejected += 1
+            logger.warning("⏳ Alert queue full (%d queued), rejecting trigger request", len(alert_queue))
+            return jsonify({
+                'error': 'Alert queue is full, retry later',
+                'queue': alert_queue.stats()
+            }), 429, {'Retry-After': '1'}
+        
         if response_data:
-            print(f"🔍 Checking filter for response data...")
-            if not should_send_message(response_data):
-                print(f"🚫 Message filtered out due to price filter")
+            # Nothing awaited since unseen(), so these are exactly the events the alerts were built from
+            _, new_ids = poll_state.claim_new(new_events)
+            
+            # Add enhanced messages to queue for the bot to process; put() waits for room instead of
+            # counting the alerts that did not fit right away as rejected
+            for enhanced_message, recipients, record in alerts:
+                logger.debug("🔍 Enhanced message for %d users: %s", len(recipients), enhanced_message)
+                await alert_queue.put(enhanced_message, recipients, record)
+            
+            await asyncio.to_thread(poll_state.save, new_ids=new_ids)
+            
+            if not alerts:
+                logger.debug("🚫 All events filtered out by advanced filters")
                 return jsonify({
                     'success': True,
                     'message': 'Message filtered out due to price range',
                     'filtered': True
                 })
-            else:
-                print(f"✅ Message passed filter, proceeding with broadcast")
-                
-                # Extract data and create properly formatted message
-                extracted_data = extract_data_from_response(response_data)
-                print(f"🔍 Extracted data: {extracted_data}")
-                
-                # Create enhanced message with txhash
-                enhanced_message = create_enhanced_message(extracted_data, response_data)
-                print(f"🔍 Enhanced message: {enhanced_message}")
-                
-                # Add enhanced message to queue for the bot to process
-                message_queue.put(enhanced_message)
+            
+            logger.debug("✅ %d events passed filter, broadcast queued", len(alerts))
         else:
-            print(f"🔍 No response data provided, using original message")
+            logger.debug("🔍 No response data provided, using original message")
             # Add original message to queue for the bot to process
-            message_queue.put(message)
+            enqueue_alert(message)
         
-        print(f"✅ Broadcast triggered for {len(user_ids)} users")
+        logger.info("✅ Broadcast triggered for %d users", len(user_ids))
         return jsonify({
             'success': True,
             'message': f'Broadcast triggered for {len(user_ids)} users'
         })
         
     except Exception as e:
-        print(f"❌ Error in trigger_telegram: {e}")
+        logger.exception("❌ Error in trigger_telegram: %s", e)
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/test-price-extraction', methods=['POST'])
-def test_price_extraction():
+async def test_price_extraction():
     """Test endpoint to debug data extraction."""
     try:
-        data = request.get_json()
+        data = await request.get_json()
         response_data = data.get('responseData', {})
         
-        extracted_data = extract_data_from_response(response_data)
+        records = extract_data_from_response(response_data)
         
         return jsonify({
             'success': True,
-            'extracted_data': extracted_data,
+            'extracted_data': [record.to_dict() for record in records],
             'advanced_filter': advanced_filter,
-            'should_send': should_send_message(response_data)
+            'should_send': [should_send_message(record) for record in records],
+            'matching_users': [len(get_alert_recipients(record)) for record in records]
         })
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/test-api-response', methods=['GET'])
-def test_api_response():
+async def test_api_response():
     """Test endpoint to see actual API response structure."""
     try:
-        import requests
-        
-        headers = {
-            'Api-Key': API_KEY
-        }
+        # Shares the cached Send Alert lookup, so reloading the debug panel doesn't hit Doma each time
+        result = await lookup_doma_api()
         
-        response = requests.get(URL, headers=headers, timeout=10)
-        
-        if response.status_code == 200:
-            data = response.json()
-            extracted_data = extract_data_from_response(data)
+        if result['success']:
+            data = result['response']
+            records = extract_data_from_response(data)
+            # The debug panel shows the first event of the page
+            record = records[0] if records else EventRecord(None)
+            extracted_data = record.to_dict()
             
-            # Find all potential addresses in the response
-            all_addresses = find_all_addresses(data)
+            # One traversal finds every address and hash, with paths for display
+            walk = walk_json(data, collect_paths=True)
             
             return jsonify({
                 'success': True,
                 'raw_response': data,
                 'extracted_data': extracted_data,
-                'domain_name': extracted_data.get('name', 'NOT_FOUND'),
-                'domain_length': len(extracted_data.get('name', '')),
+                'all_extracted_data': [other.to_dict() for other in records],
+                'domain_name': record.name or 'NOT_FOUND',
+                'domain_length': record.name_length,
                 'domain_extensions': [ext for ext in ['.com', '.ai', '.io', '.org', '.net', '.xyz', '.eth'] 
-                                    if extracted_data.get('name', '').lower().endswith(ext.lower())],
-                'token_address': extracted_data.get('token_address', 'NOT_FOUND'),
+                                    if record.domain_name.endswith(ext)],
+                'token_address': record.token_address or 'NOT_FOUND',
+                'learned_paths': field_resolver.learned_paths(),
+                'field_resolver': field_resolver.stats(),
                 'formatted_price': extracted_data.get('price', 0) / 1e18 if extracted_data.get('price') else 0,
-                'all_addresses_found': all_addresses
+                'all_addresses_found': walk.addresses,
+                'all_hashes_found': walk.hashes
             })
         else:
             return jsonify({
                 'success': False,
-                'error': f'API returned status {response.status_code}',
-                'response': response.text
+                'error': result['error']
             })
             
     except Exception as e:
@@ -789,95 +1055,316 @@ def test_api_response():
             'error': str(e)
         })
 
+@app.route(WEBHOOK_PATH, methods=['POST'])
+async def telegram_webhook():
+    """Receive updates pushed by Telegram and hand them to the bot's update queue."""
+    # In polling mode nothing may push updates here
+    if not WEBHOOK_URL:
+        return jsonify({'error': 'Not found'}), 404
+    
+    # Constant-time comparison so the secret can't be guessed byte by byte
+    token = request.headers.get('X-Telegram-Bot-Api-Secret-Token', '')
+    if not hmac.compare_digest(token.encode(), WEBHOOK_SECRET.encode()):
+        return jsonify({'error': 'Invalid secret token'}), 403
+    
+    if not bot_application:
+        return jsonify({'error': 'Bot not initialized'}), 503
+    
+    try:
+        update = Update.de_json(await request.get_json(force=True), bot_application.bot)
+    except Exception as e:
+        logger.warning("❌ Invalid webhook update: %s", e)
+        return jsonify({'error': 'Invalid update'}), 400
+    
+    await bot_application.update_queue.put(update)
+    return jsonify({'ok': True})
+
+@app.route('/api/metrics', methods=['GET'])
+async def metrics_endpoint():
+    """Prometheus metrics for each pipeline stage, the alert queue and deliveries."""
+    return metrics.REGISTRY.render(), 200, {'Content-Type': metrics.CONTENT_TYPE}
+
 @app.route('/api/health', methods=['GET'])
-def health_check():
+async def health_check():
     """Health check endpoint."""
     return jsonify({
         'status': 'ok',
         'bot_connected': bot_application is not None,
+        'update_mode': 'webhook' if WEBHOOK_URL else 'polling',
         'users_count': len(user_ids),
+        'subscriber_filters_count': len(subscriptions.filters),
+        'digest_subscribers_count': len(digests.settings) if digests else 0,
+        'alert_queue': alert_queue.stats() if alert_queue else None,
+        'doma_api': doma_api.stats(),
+        'doma_lookup_cache': doma_lookups.stats(),
+        'field_resolver': field_resolver.stats(),
         'advanced_filter': advanced_filter
     })
 
-async def send_broadcast_message(message):
-    """Send broadcast message to all users."""
+async def send_broadcast_message(message, recipients=None, created_at=None):
+    """Send broadcast message to the given users, or to all users."""
     if not bot_application:
         return
     
-    success_count = 0
-    error_count = 0
+    chat_ids = list(user_ids if recipients is None else recipients)
+    text = f"🧪 {message} - Message from website!"
     
-    for user_id in list(user_ids):
-        try:
-            await bot_application.bot.send_message(
-                chat_id=user_id,
-                text=f"🧪 {message} - Message from website!"
-            )
-            success_count += 1
-        except Exception as e:
-            print(f"Error sending to user {user_id}: {e}")
-            error_count += 1
-            # Remove user from list if they blocked the bot
-            if "bot was blocked" in str(e).lower():
-                user_ids.discard(user_id)
+    if fanout_pool is not None:
+        # Workers deliver and report blocked users back through fanout_pool.collect()
+        fanout_pool.publish(text, chat_ids, created_at)
+        return
+    
+    result = await broadcaster.broadcast(chat_ids, text)
+    metrics.FANOUT_SECONDS.observe(result['elapsed'])
+    metrics.TELEGRAM_SENDS.inc(result['sent'], status='sent')
+    metrics.TELEGRAM_SENDS.inc(result['failed'], status='failed')
+    metrics.TELEGRAM_SENDS.inc(len(result['blocked']), status='blocked')
+    if created_at is not None:
+        metrics.END_TO_END_SECONDS.observe(time.time() - created_at)
+    
+    # Remove users who blocked the bot
+    for user_id in result['blocked']:
+        remove_subscriber(user_id)
+    
+    error_count = result['failed'] + len(result['blocked'])
+    logger.info("Broadcast completed: %d success, %d failed in %.2fs", result['sent'], error_count, result['elapsed'])
+
+async def send_digest(user_id, text):
+    """Send one subscriber their combined digest message."""
+    if fanout_pool is not None:
+        fanout_pool.publish(text, [user_id])
+        return
     
-    print(f"Broadcast completed: {success_count} success, {error_count} failed")
+    status = await broadcaster.send_one(user_id, text)
+    metrics.TELEGRAM_SENDS.inc(status=status)
+    if status == 'blocked':
+        remove_subscriber(user_id)
+
+def event_timestamp(record):
+    """Return eventCreatedAt as a Unix timestamp, or None if it is missing or unparseable."""
+    if record is None or not isinstance(record.created_at, str):
+        return None
+    try:
+        return datetime.fromisoformat(record.created_at.replace('Z', '+00:00')).timestamp()
+    except ValueError:
+        return None
+
+async def run_api_server():
+    """Serve the API on the bot's event loop until api_shutdown is set."""
+    await app.run_task(host=API_HOST, port=API_PORT, shutdown_trigger=api_shutdown.wait)
+
+def log_api_server_exit(task):
+    """Done callback for the API server task: a server that dies (e.g. port in use) must not go unnoticed."""
+    if not task.cancelled() and task.exception() is not None:
+        logger.error("❌ API server on port %d stopped, /api/* and the webhook are unavailable: %s", API_PORT, task.exception())
+
+def add_subscriber(user_id):
+    """Register a user for broadcasts."""
+    if user_id not in user_ids:
+        subscriber_store.add(user_id)
+    user_ids.add(user_id)
+    subscriptions.add_subscriber(user_id)
+
+def remove_subscriber(user_id):
+    """Forget a user and their filter."""
+    if user_id in user_ids:
+        subscriber_store.remove(user_id)
+    user_ids.discard(user_id)
+    subscriptions.remove_subscriber(user_id)
+    if digests is not None:
+        digests.forget(user_id)
+
+def set_subscriber_filter(user_id, subscriber_filter):
+    """Give a subscriber their own filter and persist it."""
+    subscriptions.set_filter(user_id, subscriber_filter)
+    subscriber_store.set_filter(user_id, subscriber_filter.to_dict())
 
-def run_flask_app():
-    """Run Flask app in a separate thread."""
-    app.run(host='0.0.0.0', port=5000, debug=False)
+def configure_digest_mode(user_id, settings):
+    """Put a subscriber in digest mode and persist the settings."""
+    digests.configure(user_id, settings)
+    subscriber_store.set_digest(user_id, settings.window, settings.max_events)
+
+def disable_digest(user_id):
+    """Take a subscriber out of digest mode and forget the stored settings."""
+    digests.disable(user_id)
+    subscriber_store.set_digest(user_id)
+
+def load_subscribers():
+    """Restore the subscriber roster, personal filters and digest settings saved by previous runs."""
+    subscriber_store.open()
+    stored_ids = subscriber_store.load()
+    user_ids.update(stored_ids)
+    subscriptions.add_subscribers(stored_ids)
+    
+    stored_filters = subscriber_store.load_filters()
+    for user_id, filter_dict in stored_filters.items():
+        if user_id in user_ids:
+            subscriptions.set_filter(user_id, SubscriberFilter(**filter_dict))
+    
+    # Restored without configure() so a large roster doesn't log one line per subscriber
+    stored_digests = subscriber_store.load_digests()
+    digests.settings.update(
+        (user_id, DigestSettings(window, max_events))
+        for user_id, (window, max_events) in stored_digests.items() if user_id in user_ids
+    )
+    logger.info("👥 Loaded %d subscribers, %d personal filters and %d digest settings",
+                len(stored_ids), len(stored_filters), len(stored_digests))
+
+def enqueue_alert(message, recipients=None, record=None):
+    """Queue an alert without waiting; returns False if the full queue rejected it."""
+    return alert_queue.offer(message, recipients, record)
 
 async def process_message_queue():
     """Process messages from the queue."""
     while True:
+        # Sleeps until an alert is handed off, no polling while idle
+        message, recipients, record = await alert_queue.get()
         try:
-            # Check if there are messages in the queue
-            if not message_queue.empty():
-                message = message_queue.get_nowait()
-                await send_broadcast_message(message)
-            await asyncio.sleep(0.1)  # Small delay to prevent busy waiting
-        except queue.Empty:
-            await asyncio.sleep(0.1)
+            if record is not None:
+                # Digest subscribers get the event buffered, everyone else gets it now
+                recipients = digests.hold(record, user_ids if recipients is None else recipients)
+            if recipients is None or recipients:
+                await send_broadcast_message(message, recipients, event_timestamp(record))
         except Exception as e:
-            print(f"Error processing message queue: {e}")
-            await asyncio.sleep(1)
+            logger.exception("Error processing message queue: %s", e)
 
 def main():
     """Start the bot."""
-    global bot_application
+    global bot_application, broadcaster, digests, fanout_pool
+    
+    setup_logging()
     
     if BOT_TOKEN == 'YOUR_BOT_TOKEN_HERE':
         print("❌ Please set your TELEGRAM_BOT_TOKEN environment variable!")
         print("Get your bot token from @BotFather on Telegram")
         sys.exit(1)
     
+    if WEBHOOK_URL and not WEBHOOK_SECRET:
+        # The webhook route is public, without the secret anyone could post forged updates
+        print("❌ Webhook mode needs TELEGRAM_WEBHOOK_SECRET to be set!")
+        sys.exit(1)
+    
+    # Before the subscribers, whose digest settings it restores
+    digests = DigestBuffer(send_digest, create_digest_message)
+    load_subscribers()
+    poll_state.open()
+    
+    if FANOUT_WORKERS > 0:
+        fanout_pool = FanoutPool(BOT_TOKEN, base_url=TELEGRAM_API_BASE_URL)
+        fanout_pool.start()
+    
     # Create the Application
-    application = Application.builder().token(BOT_TOKEN).build()
+    application = Application.builder().token(BOT_TOKEN).base_url(TELEGRAM_API_BASE_URL).build()
     bot_application = application  # Set global reference for API
+    broadcaster = Broadcaster(application.bot)
     
     # Add handlers
     application.add_handler(CommandHandler("start", start))
+    application.add_handler(CommandHandler("digest", digest_command))
     application.add_handler(CallbackQueryHandler(send_alert, pattern='^send_alert$'))
     application.add_handler(CallbackQueryHandler(get_website_text, pattern='^get_website_text$'))
     application.add_handler(CallbackQueryHandler(broadcast_test, pattern='^broadcast_test$'))
     application.add_handler(CallbackQueryHandler(main_menu, pattern='^main_menu$'))
     
-    # Add post_init handler to start queue processor
+    # Add post_init handler to start queue processor and the Doma poller
     async def post_init(application):
-        asyncio.create_task(process_message_queue())
+        global alert_queue
+        alert_queue = AlertQueue()
+        metrics.ALERT_QUEUE_DEPTH.set_function(lambda: len(alert_queue))
+        metrics.ALERT_QUEUE_OLDEST_AGE.set_function(alert_queue.oldest_age)
+        metrics.ALERT_QUEUE_OVERFLOWS.set_function(lambda: {
+            'rejected': alert_queue.rejected,
+            'dropped': alert_queue.dropped,
+            'coalesced': alert_queue.coalesced
+        })
+        metrics.SUBSCRIBERS.set_function(lambda: len(user_ids))
+        metrics.UPSTREAM_CIRCUIT_OPEN.set_function(lambda: {'doma': STATE_VALUES[doma_api.breaker.state]})
+        application.bot_data['api_server'] = asyncio.create_task(run_api_server())
+        application.bot_data['api_server'].add_done_callback(log_api_server_exit)
+        # Cancelled in post_stop, before the clients and stores they use are closed
+        application.bot_data['background_tasks'] = [
+            asyncio.create_task(process_message_queue()),
+            asyncio.create_task(subscriber_store.run()),
+            asyncio.create_task(digests.run())
+        ]
+        if POLLER_ENABLED:
+            application.bot_data['background_tasks'].append(asyncio.create_task(poll_doma_events()))
+        if fanout_pool is not None:
+            # Not cancelled: it ends by itself once fanout_pool.close() has collected the last results
+            application.bot_data['fanout_collect'] = asyncio.create_task(fanout_pool.collect(remove_subscriber))
     
-    application.post_init = post_init
+    async def post_stop(application):
+        api_shutdown.set()
+        try:
+            await application.bot_data['api_server']
+        except Exception:
+            # Already logged by log_api_server_exit; the cleanup below must still run
+            pass
+        
+        # Stop polling and sending first, so nothing touches the HTTP clients or the stores after post_shutdown closes them
+        tasks = application.bot_data.get('background_tasks', [])
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        
+        # The bot can still send here, so deliver whatever digests are pending
+        await digests.close()
+        if fanout_pool is not None:
+            await asyncio.to_thread(fanout_pool.close)
+            await application.bot_data['fanout_collect']
     
-    # Start Flask app in a separate thread
-    flask_thread = threading.Thread(target=run_flask_app, daemon=True)
-    flask_thread.start()
+    async def post_shutdown(application):
+        await http_client.aclose()
+        await subscriber_store.close()
+        await asyncio.to_thread(poll_state.close)
     
-    print("🤖 Bot is starting...")
-    print("🌐 API server running on http://localhost:5000")
-    print("Press Ctrl+C to stop the bot")
+    application.post_init = post_init
+    application.post_stop = post_stop
+    application.post_shutdown = post_shutdown
+    
+    logger.info("🤖 Bot is starting...")
+    logger.info("🌐 API server starting on http://localhost:%d", API_PORT)
+    logger.info("Press Ctrl+C to stop the bot")
     
     # Run the bot
-    application.run_polling(allowed_updates=Update.ALL_TYPES)
+    if WEBHOOK_URL:
+        logger.info("📨 Webhook mode: updates arrive at %s%s", WEBHOOK_URL, WEBHOOK_PATH)
+        try:
+            asyncio.run(run_webhook(application))
+        except KeyboardInterrupt:
+            # Ctrl+C where signal handlers aren't available; run_webhook already shut down cleanly
+            pass
+    else:
+        application.run_polling(allowed_updates=ALLOWED_UPDATES)
+
+async def run_webhook(application):
+    """Run the application on updates pushed to the API server instead of getUpdates."""
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    try:
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop_event.set)
+    except NotImplementedError:
+        # Windows: Ctrl+C cancels this task instead and the finally below still shuts down
+        pass
+    
+    # Same lifecycle as run_polling, with the webhook registered in place of the updater
+    await application.initialize()
+    await application.post_init(application)
+    await application.bot.set_webhook(
+        url=f"{WEBHOOK_URL}{WEBHOOK_PATH}",
+        allowed_updates=ALLOWED_UPDATES,
+        secret_token=WEBHOOK_SECRET
+    )
+    await application.start()
+    
+    try:
+        await stop_event.wait()
+    finally:
+        await application.stop()
+        await application.post_stop(application)
+        await application.shutdown()
+        await application.post_shutdown(application)
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,99 @@
+import os
+import sys
+import time
+import json
+import requests
+
+WEBHOOK_ENDPOINT = os.getenv('WEBHOOK_SELFTEST_URL', 'http://localhost:5000/telegram/webhook')
+WEBHOOK_SECRET = os.getenv('TELEGRAM_WEBHOOK_SECRET', '')
+
+# Buttons that only answer the chat that pressed them
+SAFE_BUTTONS = ['main_menu', 'get_website_text']
+# Send Alert calls the Doma API and Broadcast Test messages every subscriber of the running bot
+LIVE_BUTTONS = ['send_alert', 'broadcast_test']
+
+def make_updates(chat_id, buttons=SAFE_BUTTONS):
+    """Sample updates for /start and the given buttons."""
+    user = {'id': chat_id, 'is_bot': False, 'first_name': 'Selftest'}
+    chat = {'id': chat_id, 'type': 'private', 'first_name': 'Selftest'}
+    now = int(time.time())
+
+    updates = [{
+        'update_id': 1,
+        'message': {
+            'message_id': 1,
+            'date': now,
+            'chat': chat,
+            'from': user,
+            'text': '/start',
+            'entities': [{'type': 'bot_command', 'offset': 0, 'length': 6}]
+        }
+    }]
+
+    for index, data in enumerate(buttons, start=2):
+        updates.append({
+            'update_id': index,
+            'callback_query': {
+                'id': str(index),
+                'from': user,
+                'chat_instance': str(chat_id),
+                'data': data,
+                'message': {'message_id': 1, 'date': now, 'chat': chat, 'text': 'menu'}
+            }
+        })
+
+    return updates
+
+def replay(updates):
+    """POST each update to the webhook like Telegram would and report status and latency."""
+    headers = {'Content-Type': 'application/json'}
+    if WEBHOOK_SECRET:
+        headers['X-Telegram-Bot-Api-Secret-Token'] = WEBHOOK_SECRET
+
+    ok = True
+    for update in updates:
+        kind = 'message' if 'message' in update else f"callback_query:{update['callback_query']['data']}"
+        started_at = time.perf_counter()
+        try:
+            response = requests.post(WEBHOOK_ENDPOINT, data=json.dumps(update), headers=headers, timeout=10)
+            elapsed = (time.perf_counter() - started_at) * 1000
+            status = '✅' if response.status_code == 200 else '❌'
+            ok = ok and response.status_code == 200
+            print(f"{status} {kind}: HTTP {response.status_code} in {elapsed:.1f}ms")
+        except Exception as e:
+            ok = False
+            print(f"❌ {kind}: {e}")
+
+    return ok
+
+def check_rejects_bad_secret():
+    """Without the secret header the webhook must refuse the update."""
+    if not WEBHOOK_SECRET:
+        print("ℹ️ TELEGRAM_WEBHOOK_SECRET not set, skipping the secret check")
+        return True
+
+    response = requests.post(WEBHOOK_ENDPOINT, json=make_updates(0)[0], timeout=10)
+    if response.status_code == 403:
+        print("✅ Update without secret token rejected")
+        return True
+    print(f"❌ Update without secret token got HTTP {response.status_code}")
+    return False
+
+if __name__ == "__main__":
+    # Replies go to this chat, use your own Telegram user id to see them
+    args = [arg for arg in sys.argv[1:] if arg != '--all']
+    replay_all = '--all' in sys.argv[1:]
+    chat_id = int(args[0]) if args else 1
+    buttons = SAFE_BUTTONS + LIVE_BUTTONS if replay_all else SAFE_BUTTONS
+    print(f"Replaying sample updates to {WEBHOOK_ENDPOINT} as chat {chat_id}...\n")
+    if not replay_all:
+        print(f"ℹ️ Skipping {', '.join(LIVE_BUTTONS)}, pass --all to replay them too\n")
+
+    success = replay(make_updates(chat_id, buttons))
+    success = check_rejects_bad_secret() and success
+
+    if success:
+        print("\n🎉 Webhook accepted every update!")
+    else:
+        print("\n💡 Some updates were not accepted. Is the bot running with TELEGRAM_WEBHOOK_URL set?")
+        sys.exit(1)
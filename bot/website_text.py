@@ -0,0 +1,61 @@
+"""
+Website text cache
+Extracts the visible text of the website for the Get Website Text button and
+keeps it together with the page's ETag/Last-Modified, so an unchanged page is
+revalidated with a conditional GET instead of downloaded and parsed again.
+Parsing uses lxml when it is installed and runs off the event loop.
+"""
+
+import asyncio
+
+from bs4 import BeautifulSoup
+
+import http_client
+import metrics
+
+try:
+    import lxml  # noqa: F401
+    HTML_PARSER = 'lxml'
+except ImportError:
+    HTML_PARSER = 'html.parser'
+
+def extract_text(html):
+    """Visible text of an HTML page, one block per line."""
+    return BeautifulSoup(html, HTML_PARSER).get_text(separator='\n', strip=True)
+
+class WebsiteText:
+    """Text of one page, revalidated with If-None-Match / If-Modified-Since."""
+
+    def __init__(self, url):
+        self.url = url
+        self.text = None
+        self.etag = None
+        self.last_modified = None
+
+    async def fetch(self, timeout=10):
+        """Return (status code, text); a 304 returns the cached text with status 200, errors return None."""
+        headers = {}
+        if self.text is not None:
+            if self.etag:
+                headers['If-None-Match'] = self.etag
+            if self.last_modified:
+                headers['If-Modified-Since'] = self.last_modified
+
+        response = await http_client.get(self.url, headers=headers, timeout=timeout)
+
+        if response.status_code == 304 and self.text is not None:
+            metrics.CACHE_REQUESTS.inc(cache='website_text', result='hit')
+            return 200, self.text
+
+        metrics.CACHE_REQUESTS.inc(cache='website_text', result='miss')
+        if response.status_code != 200:
+            return response.status_code, None
+
+        # Decoding and parsing are pure CPU work, keep them off the bot's event loop
+        text = await asyncio.to_thread(lambda: extract_text(response.text))
+
+        # Without a validator there is nothing to revalidate, so don't keep the text around
+        self.etag = response.headers.get('ETag')
+        self.last_modified = response.headers.get('Last-Modified')
+        self.text = text if self.etag or self.last_modified else None
+        return 200, text